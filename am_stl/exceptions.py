@@ -1,2 +1,6 @@
 class STL_LEAK_EXCEPTION(Exception):
     pass
+
+
+class STL_PRECISION_EXCEPTION(ValueError):
+    pass
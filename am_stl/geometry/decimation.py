@@ -0,0 +1,175 @@
+from typing import List, Tuple
+
+import numpy as np
+
+from am_stl.geometry.overhangs import OverhangAnalysis, calculate_overhangs
+
+
+def cluster_vertices(vertices, faces, cell_size):
+    """
+    Decimate a mesh by vertex clustering. All vertices within the same grid cell are replaced by their mean,
+    and faces that collapse to an edge or a point, or that become duplicates, are removed.
+    :param vertices: Array of shape (n, 3)
+    :param faces: Array of shape (m, 3) with vertex indices
+    :param cell_size: Side of the cubic grid cells
+    :return: Decimated vertices, decimated faces, the max distance any vertex was moved, and the total area of the
+    original faces that were removed.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+
+    cells = np.floor((vertices - vertices.min(axis=0)) / cell_size).astype(np.int64)
+    _, cluster = np.unique(cells, axis=0, return_inverse=True)
+    cluster = cluster.reshape(-1)
+    cluster_count = cluster.max() + 1
+
+    # Representative vertex of each cluster is the mean of its vertices
+    counts = np.bincount(cluster, minlength=cluster_count)
+    representatives = np.stack([np.bincount(cluster, weights=vertices[:, i], minlength=cluster_count)
+                                for i in range(3)], axis=1) / counts[:, None]
+    max_error = np.linalg.norm(vertices - representatives[cluster], axis=1).max()
+
+    new_faces = cluster[faces]
+    keep = (new_faces[:, 0] != new_faces[:, 1]) & (new_faces[:, 1] != new_faces[:, 2]) \
+        & (new_faces[:, 2] != new_faces[:, 0])
+
+    # Remove duplicate faces, independent of winding start
+    kept = np.flatnonzero(keep)
+    _, unique_index = np.unique(np.sort(new_faces[kept], axis=1), axis=0, return_index=True)
+    kept = kept[np.sort(unique_index)]
+    removed = np.ones(len(faces), dtype=bool)
+    removed[kept] = False
+    triangles = vertices[faces[removed]]
+    removed_area = np.linalg.norm(np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]),
+                                  axis=1).sum() / 2
+
+    # Drop clusters that are no longer referenced by any face
+    used, new_faces = np.unique(new_faces[kept], return_inverse=True)
+    return representatives[used], new_faces.reshape(-1, 3), max_error, float(removed_area)
+
+
+class DecimationLevel:
+    """
+    One level of a decimation hierarchy. Level with a cell_size of 0 is the full resolution mesh.
+    """
+
+    def __init__(self, vertices, faces, cell_size, max_error, removed_area=0.0):
+        self.vertices = vertices
+        self.faces = faces  # Build a FaceCollection of the level with STLfile.load_arrays(vertices, faces)
+        self.cell_size = cell_size
+        self.max_error = max_error  # Max distance between an original vertex and its decimated counterpart
+        self.removed_area = removed_area  # Area of the original faces that were removed by the decimation
+
+    def get_triangles(self, rotation=None):
+        vertices = self.vertices if rotation is None else self.vertices @ np.asarray(rotation).T
+        return vertices[self.faces]
+
+    def analyse(self, rotation=None, phi_min=np.pi / 4, ignore_grounded=False, ground_tolerance=0.01,
+                angle_tolerance=0.017) -> Tuple[OverhangAnalysis, dict]:
+        """
+        Run the overhang analysis on this level in the given orientation. The ground level is set to the lowest
+        point of the rotated mesh.
+        :return: OverhangAnalysis, and the estimated error of affected_area, affected_area_projected and
+        support_volume compared to the full resolution mesh, see error_estimate().
+        """
+        triangles = self.get_triangles(rotation)
+        ground_level = triangles[:, :, 2].min()
+        result = calculate_overhangs(triangles, phi_min=phi_min, ignore_grounded=ignore_grounded,
+                                     ground_level=ground_level, ground_tolerance=ground_tolerance,
+                                     angle_tolerance=angle_tolerance)
+        return result, self.error_estimate(triangles, result, phi_min, ground_level)
+
+    def error_estimate(self, triangles, result, phi_min, ground_level):
+        """
+        Estimated error of the totals of an analysis, caused by the decimation. This is a first order estimate, not a
+        guaranteed bound. It is the sum of:
+        - The faces that could change classification. Moving the vertices of a face by at most max_error can tilt
+          its normal by roughly 2 * max_error divided by the smallest altitude of the face.
+        - The area change of the problematic faces, at most max_error times their perimeter.
+        - The displaced heights of the problematic faces.
+        - The faces removed by the decimation, as if they were all problematic and at the top of the model.
+        """
+        if self.max_error == 0 and self.removed_area == 0:
+            return {'affected_area': 0.0, 'affected_area_projected': 0.0, 'support_volume': 0.0}
+
+        edges = np.stack([triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 1],
+                          triangles[:, 0] - triangles[:, 2]], axis=1)
+        longest = np.linalg.norm(edges, axis=2).max(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            tilt = np.minimum(np.pi, 2 * self.max_error * longest / (2 * result.area))
+        uncertain = np.abs(result.angle - phi_min) <= tilt
+
+        resized = self.max_error * np.linalg.norm(edges, axis=2).sum(axis=1)[result.problem & ~uncertain].sum()
+
+        top = triangles[:, :, 2].max(axis=1)
+        heights = top - ground_level + 2 * self.max_error
+        model_height = (top.max() - ground_level if len(top) else 0.0) + 2 * self.max_error
+        return {
+            'affected_area': float(result.area[uncertain].sum() + resized + self.removed_area),
+            'affected_area_projected': float(result.area_projected[uncertain].sum() + resized + self.removed_area),
+            'support_volume': float((result.area_projected[uncertain] * heights[uncertain]).sum()
+                                    + 2 * self.max_error * result.affected_area_projected
+                                    + resized * model_height + self.removed_area * model_height)
+        }
+
+
+class DecimationHierarchy:
+    """
+    Multi-resolution representation of a mesh, used for coarse-to-fine screening of orientations.
+    levels[0] is the full resolution mesh, and every following level is coarser.
+    """
+
+    def __init__(self, vertices, faces, resolutions=(64, 32, 16)):
+        """
+        :param vertices: Array of shape (n, 3). Should be welded, see FaceCollection.get_welded_arrays().
+        :param faces: Array of shape (m, 3) with vertex indices
+        :param resolutions: Number of grid cells along the longest side of the model, for each coarse level.
+        """
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        size = (vertices.max(axis=0) - vertices.min(axis=0)).max()
+
+        self.levels = [DecimationLevel(vertices, faces, 0, 0.0)]
+        for resolution in sorted(resolutions, reverse=True):
+            cell_size = size / resolution
+            level_vertices, level_faces, max_error, removed_area = cluster_vertices(vertices, faces, cell_size)
+            self.levels.append(DecimationLevel(level_vertices, level_faces, cell_size, max_error, removed_area))
+
+    @classmethod
+    def from_face_collection(cls, face_collection, resolutions=(64, 32, 16)):
+        vertices, faces = face_collection.get_welded_arrays()
+        return cls(vertices, faces, resolutions=resolutions)
+
+    def screen_orientations(self, rotations, keep=5, level=-1, key='affected_area', **kwargs) \
+            -> List[Tuple[np.ndarray, OverhangAnalysis]]:
+        """
+        Evaluate all orientations on a coarse level, and only refine the best ones on the full resolution mesh.
+        :param rotations: Array of rotation matrices, shape (k, 3, 3)
+        :param keep: Number of candidates that are refined on the full resolution mesh.
+        :param level: Index of the level used for screening. Coarsest by default.
+        :param key: Total that is minimized, 'affected_area', 'affected_area_projected' or 'support_volume'.
+        :param kwargs: Passed on to DecimationLevel.analyse
+        :return: List of (rotation, full resolution OverhangAnalysis), sorted from best to worst.
+        """
+        rotations = np.asarray(rotations, dtype=np.float64).reshape(-1, 3, 3)
+        coarse = self.levels[level]
+
+        scores = []
+        for rotation in rotations:
+            result, error = coarse.analyse(rotation, **kwargs)
+            # Rank by the most optimistic value within the estimated error, so that good candidates are not discarded
+            scores.append(_total(result, key) - error[key])
+
+        refined = []
+        for i in np.argsort(scores)[:keep]:
+            result, _ = self.levels[0].analyse(rotations[i], **kwargs)
+            refined.append((rotations[i], result))
+
+        refined.sort(key=lambda r: _total(r[1], key))
+        return refined
+
+
+def _total(result, key):
+    if key == 'support_volume':
+        return result.total_support_volume
+    return getattr(result, key)
@@ -68,4 +68,5 @@ class Edge:
             raise STL_LEAK_EXCEPTION('The model contains leaks, and is broken beyond repair. '
                                      'Reduced vertex proximity tolerance may in some cases resolve the issue. '
                                      f'Vertex.proximity_tolerance currently set to: {Vertex.proximity_tolerance}. '
-                                     'If you do not intend to utilize edges: load the STL with ignore_edges=true')
+                                     'If you do not intend to utilize edges: load the STL with ignore_edges=true. '
+                                     'FaceCollection.get_topology_report() lists every problem in the model.')
@@ -0,0 +1,92 @@
+import numpy as np
+
+from am_stl.geometry.z_order import ZOrder
+
+# Columns of a FaceTable, one value per face
+COLUMNS = ('z_min', 'z_max', 'angle', 'area', 'area_projected', 'grounded', 'problem')
+
+
+class FaceTable:
+    """
+    Per-face attributes stored as columns, in the same order as FaceCollection.faces.
+    Columns are read-only arrays, so that they can be handed out without copying.
+    """
+
+    def __init__(self, z_min, z_max, angle, area, area_projected, grounded, problem):
+        self.z_min = z_min  # Lowest Z coordinate of the face
+        self.z_max = z_max  # Highest Z coordinate of the face
+        self.angle = angle  # The angle between the normal vector and -Z, NaN for degenerate faces
+        self.area = area  # Face area
+        self.area_projected = area_projected  # Area of the projection of the face onto the XY-plane
+        self.grounded = grounded  # True if the face was resting on the ground in the last analysis
+        self.problem = problem  # True if the face had a problematic angle in the last analysis
+        for name in COLUMNS:
+            getattr(self, name).setflags(write=False)
+        self._z_order = None  # Built on first use, see get_z_order()
+
+    @classmethod
+    def from_triangles(cls, triangles, grounded=None, problem=None):
+        """
+        Build the geometric columns from triangles, in one vectorized pass.
+        :param triangles: Array of shape (n, 3, 3)
+        :param grounded: Boolean array with the grounded state of every face, or None for all False.
+        :param problem: Boolean array with the problem state of every face, or None for all False.
+        """
+        triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+        n = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        norm = np.linalg.norm(n, axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            angle = np.arccos(np.clip(-n[:, 2] / norm, -1.0, 1.0))
+
+        count = len(triangles)
+        grounded = np.zeros(count, dtype=bool) if grounded is None else np.array(grounded, dtype=bool)
+        problem = np.zeros(count, dtype=bool) if problem is None else np.array(problem, dtype=bool)
+        return cls(triangles[:, :, 2].min(axis=1), triangles[:, :, 2].max(axis=1), angle, norm / 2,
+                   np.abs(n[:, 2]) / 2, grounded, problem)
+
+    def get_z_order(self) -> ZOrder:
+        """
+        Top down ordering of the faces, built once per table.
+        """
+        if self._z_order is None:
+            self._z_order = ZOrder(self.z_min, self.z_max)
+        return self._z_order
+
+    def __len__(self):
+        return len(self.area)
+
+    def mask(self, z_range=None, angle_range=None, area_range=None, grounded=None, problem=None):
+        """
+        Boolean mask of the faces matching all given criteria. Criteria that are None are not applied.
+        :param z_range: (low, high). Faces that have any part within the Z band match.
+        :param angle_range: (low, high) of the angle between the normal vector and -Z, in rads.
+        :param area_range: (low, high) of the face area.
+        :param grounded: True or False
+        :param problem: True or False
+        :return: Boolean array, one value per face
+        """
+        selected = np.ones(len(self), dtype=bool)
+        if z_range is not None:
+            selected &= (self.z_max >= z_range[0]) & (self.z_min <= z_range[1])
+        if angle_range is not None:
+            selected &= (self.angle >= angle_range[0]) & (self.angle <= angle_range[1])
+        if area_range is not None:
+            selected &= (self.area >= area_range[0]) & (self.area <= area_range[1])
+        if grounded is not None:
+            selected &= self.grounded == grounded
+        if problem is not None:
+            selected &= self.problem == problem
+        return selected
+
+    def select(self, **criteria):
+        """
+        Indices of the faces matching all given criteria, see mask().
+        """
+        return np.flatnonzero(self.mask(**criteria))
+
+    def sum(self, column, indices=None):
+        """
+        Sum of a column, e.g. the area of selected faces.
+        """
+        values = getattr(self, column)
+        return float(values.sum() if indices is None else values[indices].sum())
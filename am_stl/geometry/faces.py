@@ -2,8 +2,16 @@ from typing import Tuple, List
 
 import numpy as np
 
-from am_stl.geometry.vertices import VertexCollection
+from am_stl.geometry.vertices import Vertex, VertexCollection, weld_vertices
 from am_stl.geometry.edges import Edge, EdgeCollection
+from am_stl.geometry.mass_properties import MassProperties, calculate_mass_properties, check_center_over_footprint
+from am_stl.geometry.stable_poses import StablePose, find_stable_poses
+from am_stl.geometry.fingerprint import Fingerprint, calculate_fingerprint
+from am_stl.geometry.topology import TopologyReport, WindingReport, check_topology, orient_faces
+from am_stl.geometry.thickness import calculate_wall_thickness
+from am_stl.geometry.voxels import Cavity, VoxelCache, VoxelGrid
+from am_stl.geometry.face_table import FaceTable
+from am_stl.geometry.z_order import ZOrder
 
 
 class FaceCollection:
@@ -20,10 +28,17 @@ class FaceCollection:
         self.vertex_collection = VertexCollection()
         self.edge_collection = EdgeCollection()
 
-        self.iterator_pointer = 0
         self.affected_area = 0  # Total area of model that will interface with support structures
         self.affected_area_projected = 0  # Total area of substrate that will interface with support structures
         self.support_volume = 0     # Rough approximation of support volume
+        self.thin_faces = []  # Faces thinner than the min wall thickness, see check_wall_thickness()
+        self.thin_area = 0  # Total area of thin faces
+        self.voxel_cache = VoxelCache()  # Voxel grids of recently checked orientations
+
+        self._face_indices = None  # Cached (n, 3) array of vertex indices, see get_face_indices()
+        self._face_table = None  # Cached FaceTable, see get_face_table()
+        self._face_table_version = None  # Geometry version of the STLfile when the table was built
+        self._checked_tolerances = None  # Shape version and tolerances of the last passed tolerance check
 
     def append(self, face, ignore_edges=False):
         """
@@ -48,6 +63,9 @@ class FaceCollection:
         face.vertices[1].set_adjacency(face.vertices[2])
 
         self.faces.append(face)
+        self._face_indices = None
+        self._face_table = None
+        self._checked_tolerances = None
 
         if ignore_edges is not True:
             face.set_edges(self.edge_collection)
@@ -56,20 +74,22 @@ class FaceCollection:
 
     def __iter__(self):
         """
-        Contributes to making this class iterable by providing an interface
+        Iterate over the faces. Every loop gets its own iterator, so loops can be nested.
         """
-        return self
+        return iter(self.faces)
+
+    def __len__(self):
+        return len(self.faces)
 
-    def __next__(self):
+    def __reduce_ex__(self, protocol):
         """
-        Contributes to making this class iterable by providing a pointer.
+        With pickle protocol 5, pickle the model as a MeshState of flat arrays, instead of the object graph of faces,
+        vertices and edges. Lower protocols, which copy.copy() and copy.deepcopy() use, keep the default behaviour.
         """
-        if self.iterator_pointer > (len(self.faces) - 1):
-            self.iterator_pointer = 0
-            raise StopIteration
-        else:
-            self.iterator_pointer += 1
-            return self.faces[self.iterator_pointer - 1]
+        if protocol < 5:
+            return object.__reduce_ex__(self, protocol)
+        from am_stl.stl.mesh_state import MeshState  # Imported here, since mesh_state depends on this module
+        return MeshState.to_face_collection, (MeshState.from_face_collection(self),)
 
     def get_warning_count(self):
         """
@@ -78,21 +98,236 @@ class FaceCollection:
         return len(self.problem_faces)
 
     def get_vertices(self, vtype="all"):
-        return_array = []
+        """
+        Vertex coordinates of all, bad or good faces, as a list of (3, 3) arrays.
+        The arrays are views into one triangle array, selected with the face table.
+        """
         if vtype == "all":
-            for f in self.faces:
-                return_array.append(f.get_vertices_as_arrays())
+            return list(self.get_triangles())
         elif vtype == "bad":
-            for f in self.problem_faces:
-                return_array.append(f.get_vertices_as_arrays())
+            return list(self.get_triangles()[self.get_face_table().problem])
         elif vtype == "good":
-            for f in self.good_faces:
-                return_array.append(f.get_vertices_as_arrays())
-        return return_array
+            return list(self.get_triangles()[~self.get_face_table().problem])
+        return []
+
+    def get_face_table(self) -> FaceTable:
+        """
+        Per-face attribute columns (z-min, z-max, angle, area, projected area, grounded, problem) for vectorized
+        queries. The table is cached, and rebuilt when the faces, the geometry or the analysis results change.
+        """
+        version = self.stlfile.geometry_version
+        if self._face_table is None or self._face_table_version != version:
+            grounded = np.fromiter((f.grounded for f in self.faces), dtype=bool, count=len(self.faces))
+            problem = np.fromiter((f.has_bad_angle is True for f in self.faces), dtype=bool, count=len(self.faces))
+            self._face_table = FaceTable.from_triangles(self.get_triangles(), grounded=grounded, problem=problem)
+            self._face_table_version = version
+        return self._face_table
+
+    def get_z_order(self) -> ZOrder:
+        """
+        Precomputed top down ordering of the faces by their highest and lowest Z coordinate, with a sweep over
+        horizontal planes. It is refreshed together with the face table, e.g. after STLfile.transform().
+        """
+        return self.get_face_table().get_z_order()
+
+    def get_faces_by_top_z(self) -> List:
+        """
+        Faces sorted by their highest Z coordinate, highest first. Same order as sorted(faces), without comparing
+        faces one by one.
+        """
+        return [self.faces[i] for i in self.get_z_order().by_top]
+
+    def select_faces(self, **criteria) -> List:
+        """
+        Faces matching all given criteria, e.g. select_faces(z_range=(0, 10), problem=True).
+        See FaceTable.mask() for the criteria. Use get_face_table().select() to get indices instead.
+        """
+        return [self.faces[i] for i in self.get_face_table().select(**criteria)]
 
     def get_vertex_collection(self):
         return self.vertex_collection
 
+    def get_vertex_array(self):
+        """
+        Returns all vertices of the STL file as an (n, 3) float64 numpy array, whatever the storage precision.
+        Rows are indexed by Vertex.index.
+        """
+        return np.asarray(self.stlfile.vertices, dtype=np.float64).reshape(-1, 3)
+
+    def get_face_indices(self):
+        """
+        Returns an (n, 3) array with the vertex indices of every face, in the same order as FaceCollection.faces.
+        The array is cached until the collection is changed.
+        """
+        if self._face_indices is None:
+            self._face_indices = np.array([[f.vertices[0].index, f.vertices[1].index, f.vertices[2].index]
+                                           for f in self.faces], dtype=np.int64).reshape(-1, 3)
+        return self._face_indices
+
+    def get_welded_arrays(self, tolerance=None):
+        """
+        Returns the vertices and face indices of the model, where vertices in proximity of each other have been
+        merged. This is independent of the strict vertex policy used when loading the model.
+        :param tolerance: Merge tolerance. Defaults to Vertex.proximity_tolerance.
+        :return: Array of unique vertices (n, 3), array of face indices (m, 3)
+        """
+        if tolerance is None:
+            tolerance = Vertex.proximity_tolerance
+        vertices, inverse = weld_vertices(self.get_vertex_array(), tolerance)
+        return vertices, inverse[self.get_face_indices()]
+
+    def get_triangles(self):
+        """
+        Returns an (n, 3, 3) array with the vertex coordinates of every face.
+        """
+        return self.get_vertex_array()[self.get_face_indices()]
+
+    def get_median_edge_length(self):
+        """
+        Median length of the face edges, a typical feature size of the mesh.
+        """
+        triangles = self.get_triangles()
+        if len(triangles) == 0:
+            return 0.0
+        return float(np.median(np.linalg.norm(triangles - np.roll(triangles, 1, axis=1), axis=2)))
+
+    def check_tolerances(self, ground_tolerance=None, angle_tolerance=None):
+        """
+        Check the tolerances of check_for_problems() against the storage precision, see STLfile.check_tolerances().
+        The result is cached until the model is changed by more than a rotation, so rotation loops only pay for the
+        first check.
+        :raises STL_PRECISION_EXCEPTION: If a tolerance is too small for the storage precision of the model.
+        """
+        key = (self.stlfile.shape_version, ground_tolerance, angle_tolerance)
+        if self._checked_tolerances == key:
+            return
+        self.stlfile.check_tolerances(ground_tolerance=ground_tolerance, angle_tolerance=angle_tolerance,
+                                      edge_length=self.get_median_edge_length())
+        self._checked_tolerances = key
+
+    def get_mass_properties(self, density=1.0) -> MassProperties:
+        """
+        Calculate volume, surface area, centre of mass and inertia tensor of the model in one vectorized pass.
+        The model needs to be closed for the results to be meaningful.
+        :param density: Density of the material.
+        :return: MassProperties
+        """
+        return calculate_mass_properties(self.get_triangles(), density=density)
+
+    def check_center_over_footprint(self, rotations=None, ground_tolerance=0.01):
+        """
+        Check if the model would tip over when resting on the build plate, for one or several orientations.
+        :param rotations: Rotation matrix, or array of rotation matrices. None checks the current orientation.
+        :param ground_tolerance: How close a vertex needs to be to the ground in order to be considered as touching it.
+        :return: Array of booleans (True if stable), array of margins between the centre of mass and the footprint edge.
+        """
+        triangles = self.get_triangles()
+        center_of_mass = calculate_mass_properties(triangles).center_of_mass
+        return check_center_over_footprint(triangles.reshape(-1, 3), center_of_mass, rotations=rotations,
+                                           ground_tolerance=ground_tolerance)
+
+    def get_fingerprint(self) -> Fingerprint:
+        """
+        Pose invariant fingerprint of the model, used to recognize re-exports of the same part.
+        """
+        return calculate_fingerprint(self.get_triangles())
+
+    def get_topology_report(self, tolerance=None, area_tolerance=0.0) -> TopologyReport:
+        """
+        Report holes, non-manifold edges, duplicate faces and degenerate faces of the whole model.
+        Face indices in the report refer to FaceCollection.faces. Load the model with ignore_edges=True if it leaks.
+        :param tolerance: Vertex merge tolerance used to find adjacent faces. Defaults to Vertex.proximity_tolerance.
+        :param area_tolerance: Faces with an area at or below this value are degenerate.
+        :return: TopologyReport
+        """
+        vertices, faces = self.get_welded_arrays(tolerance)
+        return check_topology(vertices, faces, area_tolerance=area_tolerance)
+
+    def fix_winding(self, tolerance=None) -> WindingReport:
+        """
+        Make the winding of all faces consistent, and correct stored normals that disagree with it.
+        Faces that are flipped by a bad exporter would otherwise silently invert the overhang classification.
+        Runs in linear time over the face adjacency. Run check_for_problems again afterwards.
+        :param tolerance: Vertex merge tolerance used to find adjacent faces. Defaults to Vertex.proximity_tolerance.
+        :return: WindingReport
+        """
+        vertices, faces = self.get_welded_arrays(tolerance)
+        normals = np.asarray(self.stlfile.normals, dtype=np.float64).reshape(-1, 3)
+        stored_normals = normals[[f.normal_index for f in self.faces]]
+
+        report = orient_faces(vertices, faces, stored_normals)
+        for i in report.flipped:
+            face = self.faces[i]
+            face.flip()
+        for i in report.normal_mismatches:
+            face = self.faces[i]
+            self.stlfile.normals[face.normal_index] = face.refresh_normal_vector()
+
+        self._face_indices = None
+        self._face_table = None
+        return report
+
+    def get_stable_poses(self, angle_tolerance=0.017, include_unstable=False) -> List[StablePose]:
+        """
+        Generate the orientations the model can rest in, from the convex hull of the welded vertices.
+        Apply a candidate to the model using STLfile.transform(pose.rotation).
+        :param angle_tolerance: Max angle between two hull facet normals for them to be merged, in rads.
+        :param include_unstable: Include poses where the model would tip over.
+        :return: List of StablePose, ranked by contact area and centre of mass margin.
+        """
+        vertices, _ = self.get_welded_arrays()
+        center_of_mass = self.get_mass_properties().center_of_mass
+        return find_stable_poses(vertices, center_of_mass, angle_tolerance=angle_tolerance,
+                                 include_unstable=include_unstable)
+
+    def get_voxel_grid(self, voxel_size) -> VoxelGrid:
+        """
+        Solid voxelization of the model in its current orientation. Grids are cached, so that checking an
+        orientation again is cheap.
+        :param voxel_size: Edge length of a voxel
+        :return: VoxelGrid
+        """
+        return self.voxel_cache.get(self.get_triangles(), voxel_size)
+
+    def find_cavities(self, voxel_size) -> List[Cavity]:
+        """
+        Find enclosed voids with no escape path to the outside, where unfused powder would be trapped.
+        The model needs to be closed. Openings narrower than the voxel size are not resolved.
+        :param voxel_size: Edge length of a voxel
+        :return: List of Cavity, largest first
+        """
+        return self.get_voxel_grid(voxel_size).find_cavities()
+
+    def check_wall_thickness(self, min_thickness, max_distance=None) -> Tuple[List, List]:
+        """
+        Sets FaceCollection attributes FaceCollection.thin_faces and FaceCollection.thin_area, and the thickness
+        attribute of every face. The thickness of a face is measured by a ray cast inwards from its centroid.
+        The model needs to be closed and consistently wound, see fix_winding().
+        :param min_thickness: Smallest wall thickness that can be printed
+        :param max_distance: Rays are stopped after this distance. Defaults to twice the min thickness.
+        Faces where the ray is stopped get an infinite thickness.
+        :return: List of thin faces, List of other faces.
+        """
+        if max_distance is None:
+            max_distance = 2 * min_thickness
+        triangles = self.get_triangles()
+        thickness = calculate_wall_thickness(triangles, max_distance=max_distance)
+        areas = np.linalg.norm(np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]),
+                               axis=1) / 2
+
+        thin = thickness < min_thickness
+        self.thin_area = float(areas[thin].sum())
+        self.thin_faces = []
+        thick_faces = []
+        for f, t, is_thin in zip(self.faces, thickness.tolist(), thin.tolist()):
+            f.thickness = t
+            if is_thin:
+                self.thin_faces.append(f)
+            else:
+                thick_faces.append(f)
+
+        return self.thin_faces, thick_faces
+
     def check_for_problems(self, phi_min=np.pi / 4, ignore_grounded=False, ground_level=0, ground_tolerance=0.01,
                            angle_tolerance=0.017) -> Tuple[List, List]:
         """
@@ -104,7 +339,9 @@ class FaceCollection:
         :param ground_tolerance: Tolerance for what counts as grounded or not
         :param angle_tolerance: Tolerance for acceptable overhang angles.
         :return: List of problem faces, List of good faces.
+        :raises STL_PRECISION_EXCEPTION: If a tolerance is too small for the storage precision of the model.
         """
+        self.check_tolerances(ground_tolerance=ground_tolerance, angle_tolerance=angle_tolerance)
         self.affected_area = 0
         self.affected_area_projected = 0
         self.good_faces = []
@@ -119,8 +356,27 @@ class FaceCollection:
             else:
                 self.good_faces.append(f)
 
+        self._face_table = None
         return self.problem_faces, self.good_faces
 
+    def get_support_profile(self, layer_height):
+        """
+        Cross-section area of the support structures on every layer, from the top of the model down, for the results
+        of the last check_for_problems(). Support is modelled as vertical columns below the problem faces, as for the
+        support volume, and a column is counted on every layer below the top of its face.
+        :param layer_height: Distance between layers.
+        :return: Array of layer heights, in descending order, and array of support areas on these layers.
+        """
+        table = self.get_face_table()
+        levels = []
+        areas = []
+        area = 0.0
+        for z, entering, _ in table.get_z_order().sweep(step=layer_height):
+            area += table.sum('area_projected', entering[table.problem[entering]])
+            levels.append(z)
+            areas.append(area)
+        return np.array(levels), np.array(areas)
+
 
 class Face:
     """
@@ -134,8 +390,8 @@ class Face:
         phi_min: minimum angular difference between normal vector and -z_hat before marked as a problematic surface
         """
         self.face_collection = face_collection
-        self.normal_index = None
-        self.vertex_index = None
+        self.normal_index = normal_index  # Index of the stored normal in STLfile.normals
+        self.vertex_index = vertex_index
 
         self.vertices = []
 
@@ -153,6 +409,7 @@ class Face:
         self.has_bad_angle = None  # True if this face has a problematic angle
         self.angle = None  # The angle compared to the xy-plane
         self.grounded = False
+        self.thickness = None  # Local wall thickness, see FaceCollection.check_wall_thickness()
         self.vector1 = None
         self.vector2 = None
 
@@ -167,6 +424,14 @@ class Face:
         self.edge2.associate_with_face(self)
         self.edge3.associate_with_face(self)
 
+    def flip(self):
+        """
+        Invert the winding of the face, which inverts its normal vector.
+        """
+        self.vertices[1], self.vertices[2] = self.vertices[2], self.vertices[1]
+        self.edge1, self.edge3 = self.edge3, self.edge1
+        return self.refresh_normal_vector()
+
     def __connect_vertices__(self):
         """
         Connect all vertices to each other
@@ -176,8 +441,7 @@ class Face:
         self.vertices[1].set_adjacency(self.vertices[2])
 
     def get_top_z(self):
-        z_array = np.array(self.get_vertices_as_arrays())[:, 2]
-        return z_array[np.argsort(z_array)[2]]
+        return max(self.vertices[0].z(), self.vertices[1].z(), self.vertices[2].z())
 
     def refresh_normal_vector(self):
         self.vector1 = self.vertices[1].get_array() - self.vertices[0].get_array()
@@ -288,10 +552,10 @@ class Face:
         return [self.edge1, self.edge2, self.edge3]
 
     def __lt__(self, other):
-        if self.get_top_z() > other.get_top_z():
-            return True
-        else:
-            return False
+        """
+        Faces are ordered from the top down. Use FaceCollection.get_faces_by_top_z() to sort many faces.
+        """
+        return self.get_top_z() > other.get_top_z()
 
     def check_grounded(self, ground_level, ground_tolerance):
         """
@@ -0,0 +1,196 @@
+import hashlib
+
+import numpy as np
+
+from am_stl.geometry.mass_properties import calculate_mass_properties
+from am_stl.geometry.overhangs import calculate_overhangs
+
+
+class Fingerprint:
+    """
+    Pose invariant description of a mesh. Two exports of the same part, in different positions or orientations,
+    get the same fingerprint.
+    """
+
+    def __init__(self, key, features, center, axes, ambiguous):
+        self.key = key  # Hash of the quantized features
+        self.features = features  # Feature vector, used for matching within a tolerance
+        self.center = center  # Centre of mass in the coordinates of the mesh
+        self.axes = axes  # Principal axes as columns, the canonical frame of the part
+        self.ambiguous = ambiguous  # True if the principal axes are not uniquely defined, e.g. for a cube
+
+    def matches(self, other, rtol=1e-3):
+        # The handedness, the last feature, needs to be equal. The absolute tolerance of the other features is
+        # scaled by the largest of them.
+        if self.features[-1] != other.features[-1]:
+            return False
+        return np.allclose(self.features, other.features, rtol=rtol, atol=rtol * np.abs(self.features).max())
+
+    def to_canonical(self, rotation):
+        """
+        Express a rotation of this part as a rotation of its canonical frame.
+        """
+        return np.asarray(rotation) @ self.axes
+
+    def from_canonical(self, rotation):
+        """
+        Express a rotation of the canonical frame as a rotation of this part.
+        """
+        return np.asarray(rotation) @ self.axes.T
+
+
+def calculate_fingerprint(triangles, bins=16, digits=3) -> Fingerprint:
+    """
+    Calculate a pose invariant fingerprint of a mesh, in one vectorized pass.
+    The features are the volume, area and principal moments, the sorted extents along the principal axes,
+    area weighted histograms of the face distance from the centre of mass and of the face normal direction
+    relative to each principal axis, and the handedness of the part. All other features are unchanged by a
+    reflection, so the handedness keeps mirrored parts, e.g. left and right hand versions, apart.
+    :param triangles: Array of shape (n, 3, 3)
+    :param bins: Number of bins in each histogram
+    :param digits: Number of significant digits kept when quantizing features into the key.
+    :return: Fingerprint
+    """
+    triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    props = calculate_mass_properties(triangles)
+    axes = props.principal_axes.copy()
+
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    areas = np.linalg.norm(cross, axis=1) / 2
+    normals = cross / np.where(areas > 0, 2 * areas, 1)[:, None]
+    centroids = (triangles.sum(axis=1) / 3 - props.center_of_mass) @ axes
+
+    # The sign of an eigenvector is arbitrary. Point every axis towards the heavier tail of the surface.
+    skew = (areas[:, None] * centroids ** 3).sum(axis=0)
+    signs = np.where(skew < 0, -1.0, 1.0)
+    # The frame given by the skew is right handed for a part, and left handed for its mirror image
+    handedness = np.sign(np.prod(signs) * np.linalg.det(axes))
+    if handedness < 0:
+        signs[np.argmin(np.abs(skew))] *= -1  # Keep the frame right handed
+    axes *= signs
+    centroids *= signs
+
+    canonical_vertices = (triangles.reshape(-1, 3) - props.center_of_mass) @ axes
+    extents = np.sort(canonical_vertices.max(axis=0) - canonical_vertices.min(axis=0))
+
+    radius = np.linalg.norm(centroids, axis=1)
+    radial_histogram, _ = np.histogram(radius / max(radius.max(), 1e-12), bins=bins, range=(0, 1), weights=areas)
+    angle_histograms = [np.histogram(np.abs(normals @ axes[:, i]), bins=bins, range=(0, 1), weights=areas)[0]
+                        for i in range(3)]
+
+    # Principal axes are only defined up to rotation if two principal moments are equal, and their signs are only
+    # defined if at most one axis has a symmetric surface distribution.
+    moments = props.principal_moments
+    gaps = np.diff(moments) / max(moments.max(), 1e-12)
+    symmetric = np.abs(skew) < 1e-5 * props.area * max(extents.max(), 1e-12) ** 3
+    ambiguous = bool(np.any(gaps < 10 ** -digits)) or int(symmetric.sum()) >= 2
+    if np.any(symmetric):
+        # The sign of a symmetric axis is arbitrary, so the handedness can not be told from the skew
+        handedness = 0.0
+
+    features = np.concatenate([
+        [abs(props.volume), props.area], props.principal_moments, extents,
+        radial_histogram / props.area, np.concatenate(angle_histograms) / props.area, [handedness]
+    ])
+
+    quantized = [float(f'{value:.{digits}g}') for value in features]
+    key = hashlib.sha1(repr(quantized).encode('utf-8')).hexdigest()
+    return Fingerprint(key, features, props.center_of_mass, axes, ambiguous)
+
+
+class CacheEntry:
+    """
+    Cached per-orientation results of one part geometry. Orientations are stored in the canonical frame of the
+    part, so that they can be reused by any pose of the same part.
+    """
+
+    def __init__(self, fingerprint):
+        self.fingerprint = fingerprint
+        self.results = []  # List of (canonical rotation, analysis parameters, result)
+
+    def store(self, fingerprint, rotation, result, params=()):
+        self.results.append((fingerprint.to_canonical(rotation), params, result))
+
+    def get(self, fingerprint, rotation, params=(), atol=1e-6):
+        """
+        Fetch the result of an orientation, given as a rotation of the part described by fingerprint.
+        :return: The cached result, or None
+        """
+        canonical = fingerprint.to_canonical(rotation)
+        for stored, stored_params, result in self.results:
+            if stored_params == params and np.allclose(stored, canonical, atol=atol):
+                return result
+        return None
+
+    def get_all(self, fingerprint, params=()):
+        """
+        All cached results, with their orientations transformed to rotations of the part described by fingerprint.
+        :return: List of (rotation, result)
+        """
+        return [(fingerprint.from_canonical(stored), result) for stored, stored_params, result in self.results
+                if stored_params == params]
+
+
+class AnalysisCache:
+    """
+    Cache of analysis results, keyed by geometry fingerprint. Parts that are re-exported in a different position
+    or orientation share their cache entry.
+    """
+
+    def __init__(self, rtol=1e-3):
+        self.rtol = rtol
+        self.entries = {}
+
+    def find(self, fingerprint):
+        """
+        Find the entry of a fingerprint, first by key, then by comparing features within the tolerance.
+        :return: CacheEntry or None
+        """
+        if fingerprint.ambiguous:
+            # Orientations can not be mapped between poses of symmetric parts. Only identical keys and
+            # an identical frame are accepted.
+            entry = self.entries.get(fingerprint.key)
+            if entry is not None and np.allclose(entry.fingerprint.axes, fingerprint.axes):
+                return entry
+            return None
+
+        if fingerprint.key in self.entries:
+            return self.entries[fingerprint.key]
+        for entry in self.entries.values():
+            if not entry.fingerprint.ambiguous and entry.fingerprint.matches(fingerprint, rtol=self.rtol):
+                return entry
+        return None
+
+    def entry(self, fingerprint):
+        """
+        Find the entry of a fingerprint, or create a new one.
+        """
+        entry = self.find(fingerprint)
+        if entry is None:
+            entry = CacheEntry(fingerprint)
+            self.entries.setdefault(fingerprint.key, entry)
+        return entry
+
+    def analyse(self, face_collection, rotation=None, **kwargs):
+        """
+        Overhang analysis of a part in an orientation, reusing cached results of identical geometry.
+        The ground level is set to the lowest point of the rotated part.
+        :param face_collection: FaceCollection
+        :param rotation: Rotation matrix applied to the part before the analysis. None keeps the current pose.
+        :param kwargs: Passed on to calculate_overhangs
+        :return: Dict of analysis totals, see OverhangAnalysis.to_dict(), and True if it was a cache hit.
+        """
+        rotation = np.eye(3) if rotation is None else np.asarray(rotation, dtype=np.float64)
+        triangles = face_collection.get_triangles()
+        fingerprint = calculate_fingerprint(triangles)
+        entry = self.entry(fingerprint)
+        params = tuple(sorted(kwargs.items()))
+
+        result = entry.get(fingerprint, rotation, params=params)
+        if result is not None:
+            return result, True
+
+        rotated = triangles @ rotation.T
+        result = calculate_overhangs(rotated, ground_level=rotated[:, :, 2].min(), **kwargs).to_dict()
+        entry.store(fingerprint, rotation, result, params=params)
+        return result, False
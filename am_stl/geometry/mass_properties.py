@@ -0,0 +1,146 @@
+import numpy as np
+
+
+class MassProperties:
+    """
+    Volume, surface area, centre of mass and inertia tensor of a closed triangle mesh.
+    All values are calculated in a single pass using signed tetrahedron integration, where every face forms a
+    tetrahedron together with the origin. The mesh needs to be closed and consistently wound for the results to
+    be meaningful.
+    """
+
+    def __init__(self, volume, area, center_of_mass, inertia, density=1.0):
+        self.volume = volume
+        self.area = area
+        self.density = density
+        self.mass = volume * density
+        self.center_of_mass = center_of_mass
+        self.inertia = inertia  # Inertia tensor around the centre of mass
+
+        # Principal moments (ascending) and the corresponding principal axes (as columns)
+        self.principal_moments, self.principal_axes = np.linalg.eigh(inertia)
+
+    def __str__(self):
+        return "MassProperties(volume={}, area={}, center_of_mass={})".format(
+            self.volume, self.area, self.center_of_mass)
+
+
+def calculate_mass_properties(triangles, density=1.0) -> MassProperties:
+    """
+    Calculate the mass properties of a closed mesh.
+    :param triangles: Array of shape (n, 3, 3) with the vertices of every face.
+    :param density: Density of the material. The inertia tensor is scaled by this value.
+    :return: MassProperties
+    """
+    triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    a = triangles[:, 0]
+    b = triangles[:, 1]
+    c = triangles[:, 2]
+
+    cross = np.cross(b - a, c - a)
+    area = np.linalg.norm(cross, axis=1).sum() / 2
+
+    # Signed volume of the tetrahedra spanned by the origin and each face
+    tet_volumes = np.einsum('ij,ij->i', a, np.cross(b, c)) / 6
+    volume = tet_volumes.sum()
+    if volume == 0:
+        return MassProperties(0.0, area, np.zeros(3), np.zeros((3, 3)), density=density)
+
+    s = a + b + c
+    center_of_mass = (tet_volumes[:, None] * s).sum(axis=0) / (4 * volume)
+
+    # Second moments of volume, integral of x x^T over the solid:
+    # V/20 * (a a^T + b b^T + c c^T + s s^T) for each tetrahedron
+    outer = (np.einsum('ij,ik->ijk', a, a) + np.einsum('ij,ik->ijk', b, b) + np.einsum('ij,ik->ijk', c, c)
+             + np.einsum('ij,ik->ijk', s, s))
+    second_moment = np.einsum('i,ijk->jk', tet_volumes, outer) / 20
+
+    # Move second moments to the centre of mass, and convert to an inertia tensor
+    second_moment -= volume * np.outer(center_of_mass, center_of_mass)
+    inertia = (np.trace(second_moment) * np.eye(3) - second_moment) * density
+
+    return MassProperties(volume, area, center_of_mass, inertia, density=density)
+
+
+def convex_hull_2d(points):
+    """
+    Convex hull of a set of 2D points (Andrew's monotone chain).
+    :param points: Array of shape (n, 2)
+    :return: Hull points in counter clockwise order, shape (m, 2)
+    """
+    points = np.unique(np.asarray(points, dtype=np.float64).reshape(-1, 2), axis=0)
+    if len(points) < 3:
+        return points
+
+    def cross(o, p, q):
+        return (p[0] - o[0]) * (q[1] - o[1]) - (p[1] - o[1]) * (q[0] - o[0])
+
+    lower = []
+    for p in points:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0:
+            lower.pop()
+        lower.append(p)
+
+    upper = []
+    for p in points[::-1]:
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0:
+            upper.pop()
+        upper.append(p)
+
+    return np.array(lower[:-1] + upper[:-1])
+
+
+def polygon_margin(polygon, point):
+    """
+    Signed distance from a point to the boundary of a convex polygon.
+    Positive if the point is inside of the polygon, negative if it is outside.
+    :param polygon: Convex polygon in counter clockwise order, shape (m, 2). Points and segments are accepted.
+    :param point: 2D point
+    :return: Signed distance
+    """
+    polygon = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    point = np.asarray(point, dtype=np.float64)
+
+    start = polygon
+    end = np.roll(polygon, -1, axis=0)
+    edge = end - start
+    length_sq = np.einsum('ij,ij->i', edge, edge)
+
+    # Distance to every edge segment
+    t = np.clip(np.einsum('ij,ij->i', point - start, edge) / np.where(length_sq > 0, length_sq, 1), 0, 1)
+    closest = start + t[:, None] * edge
+    distance = np.linalg.norm(point - closest, axis=1).min()
+
+    if len(polygon) < 3:
+        # A point or line contact can never enclose the centre of mass.
+        return -distance
+
+    inside = np.all(edge[:, 0] * (point[1] - start[:, 1]) - edge[:, 1] * (point[0] - start[:, 0]) > 0)
+    return distance if inside else -distance
+
+
+def check_center_over_footprint(vertices, center_of_mass, rotations=None, ground_tolerance=0.01):
+    """
+    Check if the centre of mass is located above the footprint of the model, for one or several orientations.
+    The footprint is the convex hull of all vertices within ground_tolerance of the lowest point of the model.
+    A model whose centre of mass is outside of its footprint will tip over.
+    :param vertices: Array of shape (n, 3)
+    :param center_of_mass: Centre of mass in the current orientation of the model.
+    :param rotations: Rotation matrix, or array of rotation matrices of shape (k, 3, 3).
+    Set to None to only check the current orientation.
+    :param ground_tolerance: How close a vertex needs to be to the ground in order to be considered as touching it.
+    :return: Array of booleans (True if stable), array of margins between the centre of mass and the footprint edge.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    center_of_mass = np.asarray(center_of_mass, dtype=np.float64)
+    if rotations is None:
+        rotations = np.eye(3)
+    rotations = np.asarray(rotations, dtype=np.float64).reshape(-1, 3, 3)
+
+    margins = np.empty(len(rotations))
+    for i, rotation in enumerate(rotations):
+        z = vertices @ rotation[2]
+        footprint = vertices[z <= z.min() + ground_tolerance] @ rotation[:2].T
+        margins[i] = polygon_margin(convex_hull_2d(footprint), rotation[:2] @ center_of_mass)
+
+    return margins > 0, margins
@@ -0,0 +1,158 @@
+import numpy as np
+
+from am_stl.stl.file_types import load_part_triangles
+
+
+def rasterize_footprint(triangles, pixel_size):
+    """
+    Rasterize the XY projection of a closed mesh. Only downward facing faces are used, since together they cover the
+    whole footprint, as their projected areas do in the overhang analysis.
+    :param triangles: Array of shape (n, 3, 3)
+    :param pixel_size: Edge length of a pixel
+    :return: Boolean raster of shape (nx, ny), XY coordinates of the raster corner
+    """
+    triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    lower = triangles.reshape(-1, 3)[:, :2].min(axis=0)
+    upper = triangles.reshape(-1, 3)[:, :2].max(axis=0)
+    shape = np.maximum(np.ceil((upper - lower) / pixel_size), 1).astype(np.int64)
+    raster = np.zeros(shape, dtype=bool)
+
+    n_z = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])[:, 2]
+    triangles = triangles[n_z < 0]
+
+    # Pixel range covered by the bounding box of each triangle, one row per (triangle, pixel) pair
+    first = np.maximum(np.ceil((triangles[:, :, :2].min(axis=1) - lower) / pixel_size - 0.5), 0).astype(np.int64)
+    last = np.minimum(np.floor((triangles[:, :, :2].max(axis=1) - lower) / pixel_size - 0.5),
+                      shape - 1).astype(np.int64)
+    span = np.maximum(last - first + 1, 0)
+    counts = span[:, 0] * span[:, 1]
+    ids = np.repeat(np.arange(len(triangles)), counts)
+    local = np.arange(len(ids)) - np.repeat(np.cumsum(counts) - counts, counts)
+    ix = first[ids, 0] + local % span[ids, 0]
+    iy = first[ids, 1] + local // span[ids, 0]
+    px = lower[0] + (ix + 0.5) * pixel_size
+    py = lower[1] + (iy + 0.5) * pixel_size
+
+    # Edge function test of the pixel centre against the (clockwise, seen from above) projected triangle
+    t = triangles[ids]
+    inside = np.ones(len(ids), dtype=bool)
+    for a, b in ((0, 1), (1, 2), (2, 0)):
+        inside &= (t[:, b, 0] - t[:, a, 0]) * (py - t[:, a, 1]) - (t[:, b, 1] - t[:, a, 1]) * (px - t[:, a, 0]) <= 0
+    raster[ix[inside], iy[inside]] = True
+
+    # Every triangle marks at least the pixel holding its centroid, so that thin features are not lost
+    centroid = np.floor((triangles[:, :, :2].mean(axis=1) - lower) / pixel_size).astype(np.int64)
+    centroid = np.clip(centroid, 0, shape - 1)
+    raster[centroid[:, 0], centroid[:, 1]] = True
+    return raster, lower
+
+
+def dilate(raster, radius):
+    """
+    Grow a raster by a square of the given radius in pixels, so that placed parts keep a distance to each other.
+    """
+    result = np.pad(raster, radius)
+    for axis in range(2):
+        grown = result.copy()
+        for shift in range(1, radius + 1):
+            grown |= np.roll(result, shift, axis=axis)
+            grown |= np.roll(result, -shift, axis=axis)
+        result = grown
+    return result
+
+
+class Placement:
+    """
+    Position of one part on the build plate.
+    """
+
+    def __init__(self, index, translation):
+        self.index = index  # Index of the part in the list given to nest_parts()
+        self.translation = translation  # Translation (x, y, z) that moves the part onto the plate
+
+
+class NestingResult:
+    """
+    Result of nesting parts on a build plate.
+    """
+
+    def __init__(self, placements, unplaced, plate, pixel_size):
+        self.placements = placements  # List of Placement
+        self.unplaced = unplaced  # Indices of parts that did not fit
+        self.plate = plate  # Occupancy raster of the plate
+        self.pixel_size = pixel_size
+
+    def get_translations(self):
+        """
+        Translation of every part, None for parts that did not fit.
+        """
+        translations = [None] * (len(self.placements) + len(self.unplaced))
+        for placement in self.placements:
+            translations[placement.index] = placement.translation
+        return translations
+
+    def get_utilisation(self):
+        """
+        Fraction of the plate area covered by part footprints.
+        """
+        return float(self.plate.mean())
+
+
+def nest_parts(parts, plate_size, pixel_size=1.0, spacing=2.0):
+    """
+    Place oriented parts on a build plate, largest footprint first. Collisions of a part with everything placed so
+    far are found for all positions at once, by correlating the footprint raster with the plate raster using FFTs.
+    Among the free positions, the one that keeps the bounding box of all placed parts smallest is chosen.
+    Parts are translated only, so that the orientation chosen by the overhang analysis is kept.
+    :param parts: List of FaceCollection, (n, 3, 3) triangle arrays or mesh file names. Only one part is held in
+    memory at a time.
+    :param plate_size: Size (x, y) of the build plate, with the plate corner at the origin.
+    :param pixel_size: Edge length of a raster pixel.
+    :param spacing: Min distance between parts.
+    :return: NestingResult
+    """
+    plate_shape = np.floor(np.asarray(plate_size, dtype=np.float64) / pixel_size).astype(np.int64)
+    radius = int(np.ceil(spacing / pixel_size)) + 1  # One extra pixel covers the rasterization error
+
+    footprints = []
+    for part in parts:
+        triangles = load_part_triangles(part)
+        raster, corner = rasterize_footprint(triangles, pixel_size)
+        footprints.append((raster, corner, triangles[:, :, 2].min()))
+        del triangles
+    order = sorted(range(len(parts)), key=lambda i: -int(footprints[i][0].sum()))
+
+    # The plate is padded by the spacing, so that the spacing around a part may reach beyond the plate edge
+    plate = np.zeros(plate_shape + 2 * radius, dtype=bool)
+    extent = np.zeros(2, dtype=np.int64)  # Upper corner of the bounding box of placed parts, in pixels
+    placements = []
+    unplaced = []
+    for i in order:
+        raster, corner, z_min = footprints[i]
+        free_shape = plate_shape - np.array(raster.shape) + 1
+        if np.any(free_shape < 1):
+            unplaced.append(i)
+            continue
+
+        # overlap[x, y] is the number of occupied plate pixels under the dilated part placed at (x, y)
+        part = dilate(raster, radius).astype(np.float64)
+        overlap = np.fft.irfft2(np.fft.rfft2(plate.astype(np.float64)) *
+                                np.conj(np.fft.rfft2(part, s=plate.shape)), s=plate.shape)
+        free = overlap[:free_shape[0], :free_shape[1]] < 0.5
+        if not np.any(free):
+            unplaced.append(i)
+            continue
+
+        x, y = np.nonzero(free)
+        bounds_x = np.maximum(extent[0], x + raster.shape[0])
+        bounds_y = np.maximum(extent[1], y + raster.shape[1])
+        best = np.lexsort((x, y, bounds_x * bounds_y))[0]
+        x, y = int(x[best]), int(y[best])
+
+        plate[radius + x:radius + x + raster.shape[0], radius + y:radius + y + raster.shape[1]] |= raster
+        extent = np.maximum(extent, [x + raster.shape[0], y + raster.shape[1]])
+        translation = np.array([x * pixel_size - corner[0], y * pixel_size - corner[1], -z_min])
+        placements.append(Placement(i, translation))
+
+    placements.sort(key=lambda placement: placement.index)
+    return NestingResult(placements, sorted(unplaced), plate[radius:-radius, radius:-radius], pixel_size)
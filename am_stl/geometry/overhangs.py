@@ -0,0 +1,78 @@
+import numpy as np
+
+
+class OverhangAnalysis:
+    """
+    Result of a vectorized overhang analysis of a set of triangles.
+    Per-face values are stored as arrays in the same order as the analysed triangles, while totals follow the
+    naming of the corresponding FaceCollection attributes.
+    """
+
+    def __init__(self, angle, problem, grounded, area, area_projected, support_volume):
+        self.angle = angle  # The angle between the normal vector and -Z, per face
+        self.problem = problem  # True if the face has a problematic angle
+        self.grounded = grounded  # True if the face is resting on the ground
+        self.area = area  # Face area
+        self.area_projected = area_projected  # Area of the projection of the face onto the XY-plane
+        self.support_volume = support_volume  # Support volume below each problematic face, 0 for other faces
+
+        self.affected_area = area[problem].sum()
+        self.affected_area_projected = area_projected[problem].sum()
+        self.total_support_volume = support_volume.sum()
+
+    def get_problem_indices(self):
+        return np.flatnonzero(self.problem)
+
+    def get_good_indices(self):
+        return np.flatnonzero(~self.problem)
+
+    def to_dict(self):
+        """
+        Totals of the analysis, e.g. for serialization to JSON.
+        """
+        return {
+            'problem_faces': int(self.problem.sum()),
+            'good_faces': int((~self.problem).sum()),
+            'affected_area': float(self.affected_area),
+            'affected_area_projected': float(self.affected_area_projected),
+            'support_volume': float(self.total_support_volume)
+        }
+
+
+def calculate_overhangs(triangles, phi_min=np.pi / 4, ignore_grounded=False, ground_level=0, ground_tolerance=0.01,
+                        angle_tolerance=0.017) -> OverhangAnalysis:
+    """
+    Vectorized equivalent of FaceCollection.check_for_problems, operating on an array of triangles.
+    No Face objects are needed, which makes this suitable for screening many orientations.
+    :param triangles: Array of shape (n, 3, 3) with the vertices of every face.
+    :param phi_min: Tolerated angle
+    :param ignore_grounded: Flat overhangs that are grounded are ignored.
+    :param ground_level: Manually set the ground
+    :param ground_tolerance: Tolerance for what counts as grounded or not
+    :param angle_tolerance: Tolerance for acceptable overhang angles.
+    :return: OverhangAnalysis
+    """
+    triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    vector1 = triangles[:, 1] - triangles[:, 0]
+    vector2 = triangles[:, 2] - triangles[:, 0]
+    n = np.cross(vector1, vector2)
+    norm = np.linalg.norm(n, axis=1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Degenerate faces get a NaN angle, and are never marked as problematic. Same as Face.check_for_problems.
+        angle = np.arccos(np.clip(-n[:, 2] / norm, -1.0, 1.0))
+        below_limit = angle < phi_min
+
+    area = norm / 2
+    area_projected = np.abs(n[:, 2]) / 2
+
+    grounded = below_limit & np.all(np.abs(triangles[:, :, 2] - ground_level) <= ground_tolerance, axis=1)
+    within_tolerance = (angle - phi_min) ** 2 < angle_tolerance ** 2
+    problem = below_limit & ~within_tolerance
+    if ignore_grounded is False:
+        problem &= ~grounded
+
+    heights = triangles[:, :, 2].sum(axis=1) / 3 - ground_level
+    support_volume = np.where(problem, area_projected * heights, 0.0)
+
+    return OverhangAnalysis(angle, problem, grounded, area, area_projected, support_volume)
@@ -0,0 +1,166 @@
+from os.path import getsize
+from statistics import NormalDist
+
+import numpy as np
+
+from am_stl.geometry.overhangs import calculate_overhangs
+from am_stl.stl.stl_parser import BINARY_FACET_DTYPE
+
+
+class Estimate:
+    """
+    Estimated value with the half width of its confidence interval.
+    """
+
+    def __init__(self, value, error):
+        self.value = value
+        self.error = error
+
+    def get_interval(self):
+        return self.value - self.error, self.value + self.error
+
+    def to_dict(self):
+        return {'value': float(self.value), 'error': float(self.error)}
+
+    def __str__(self):
+        return f'{self.value:g} +/- {self.error:g}'
+
+
+class OverhangEstimate:
+    """
+    Approximate overhang analysis from an area weighted sample of faces. Totals follow the naming of the
+    corresponding FaceCollection attributes.
+    """
+
+    def __init__(self, samples, total_area, problem_area_fraction, affected_area, affected_area_projected,
+                 support_volume, confidence):
+        self.samples = samples  # Number of sampled faces
+        self.total_area = total_area  # Exact surface area of the model
+        self.problem_area_fraction = problem_area_fraction  # Estimate of affected_area / total_area
+        self.affected_area = affected_area  # Estimate
+        self.affected_area_projected = affected_area_projected  # Estimate
+        self.support_volume = support_volume  # Estimate
+        self.confidence = confidence  # Confidence level of the intervals
+
+    def to_dict(self):
+        return {
+            'samples': self.samples,
+            'total_area': float(self.total_area),
+            'problem_area_fraction': self.problem_area_fraction.to_dict(),
+            'affected_area': self.affected_area.to_dict(),
+            'affected_area_projected': self.affected_area_projected.to_dict(),
+            'support_volume': self.support_volume.to_dict(),
+            'confidence': self.confidence
+        }
+
+
+def wilson_interval(fraction, n, z_score):
+    """
+    Wilson score interval of a binomial proportion. Unlike the normal approximation it has a non-zero width when
+    none, or all, of the samples are successes.
+    :param fraction: Fraction of successes in the sample
+    :param n: Sample size
+    :param z_score: Quantile of the standard normal distribution for the confidence level
+    :return: Lower and upper bound
+    """
+    z2 = z_score ** 2
+    centre = (fraction + z2 / (2 * n)) / (1 + z2 / n)
+    half_width = z_score / (1 + z2 / n) * np.sqrt(fraction * (1 - fraction) / n + z2 / (4 * n ** 2))
+    return max(centre - half_width, 0.0), min(centre + half_width, 1.0)
+
+
+def map_binary_facets(filename):
+    """
+    Memory map the facet records of a binary STL file. Records are only read from disk when they are accessed.
+    :return: Array of facet records with the BINARY_FACET_DTYPE layout
+    """
+    with open(filename, 'rb') as f:
+        f.seek(80)
+        face_count = int.from_bytes(f.read(4), byteorder='little', signed=False)
+    if getsize(filename) < 84 + BINARY_FACET_DTYPE.itemsize * face_count:
+        raise TypeError('File is not a binary STL file.')
+    if face_count == 0:
+        return np.zeros(0, dtype=BINARY_FACET_DTYPE)
+    return np.memmap(filename, dtype=BINARY_FACET_DTYPE, mode='r', offset=84, shape=(face_count,))
+
+
+def estimate_overhangs(source, phi_min=np.pi / 4, ignore_grounded=False, ground_tolerance=0.01, angle_tolerance=0.017,
+                       samples=2000, target_error=None, max_samples=200000, confidence=0.95, chunk_size=1000000,
+                       seed=0) -> OverhangEstimate:
+    """
+    Estimate the overhang analysis totals from a sample of faces, drawn with a probability proportional to their
+    area. No vertices are welded and no Face objects are created. Only the face areas and the ground level are
+    calculated for all faces, in one chunked pass over the facet records.
+    The ground is at the lowest point of the model, as after STLfile.calculate_ground_level().
+    :param source: Path to a binary STL file, or an array of facet records, see read_binary_facets().
+    :param phi_min: Tolerated angle
+    :param ignore_grounded: Flat overhangs that are grounded are ignored.
+    :param ground_tolerance: Tolerance for what counts as grounded or not
+    :param angle_tolerance: Tolerance for acceptable overhang angles.
+    :param samples: Number of faces in the first sample.
+    :param target_error: If set, the sample is doubled until the confidence interval of every total is within this
+    fraction of the total area (fractions and areas), or of the estimate (support volume, if any support is sampled).
+    :param max_samples: Max number of sampled faces when refining.
+    :param confidence: Confidence level of the intervals.
+    :param chunk_size: Number of records processed at the same time in the pass over all faces.
+    :param seed: Seed of the random generator, so that previews are reproducible.
+    :return: OverhangEstimate
+    """
+    records = map_binary_facets(source) if isinstance(source, str) else source
+    if len(records) == 0:
+        zero = Estimate(0.0, 0.0)
+        return OverhangEstimate(0, 0.0, zero, zero, zero, zero, confidence)
+
+    # One pass over all records for the face areas, the ground level and the top of the model
+    areas = np.empty(len(records))
+    ground_level = np.inf
+    top = -np.inf
+    for start in range(0, len(records), chunk_size):
+        triangles = records['vertices'][start:start + chunk_size].astype(np.float64)
+        n = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+        areas[start:start + chunk_size] = np.linalg.norm(n, axis=1) / 2
+        ground_level = min(ground_level, triangles[:, :, 2].min())
+        top = max(top, triangles[:, :, 2].max())
+    cumulative_area = np.cumsum(areas)
+    total_area = cumulative_area[-1] if len(areas) else 0.0
+
+    z_score = NormalDist().inv_cdf((1 + confidence) / 2)
+    rng = np.random.default_rng(seed)
+    values = np.zeros((0, 3))  # Per sample: problem, projected area ratio, support volume per area
+    count = samples
+    while True:
+        # Area weighted sample, with replacement
+        u = rng.random(count - len(values)) * total_area
+        indices = np.sort(np.minimum(np.searchsorted(cumulative_area, u, side='right'), len(areas) - 1))
+        triangles = records['vertices'][indices].astype(np.float64)
+        result = calculate_overhangs(triangles, phi_min=phi_min, ignore_grounded=ignore_grounded,
+                                     ground_level=ground_level, ground_tolerance=ground_tolerance,
+                                     angle_tolerance=angle_tolerance)
+        area = np.where(result.area > 0, result.area, 1)
+        values = np.concatenate([values, np.stack([result.problem, result.problem * result.area_projected / area,
+                                                   result.support_volume / area], axis=1)])
+
+        # The total of a value y over all faces is estimated by total_area times the sample mean of y / area
+        n = len(values)
+        mean = values.mean(axis=0)
+        error = z_score * values.std(axis=0, ddof=1) / np.sqrt(n) if n > 1 else np.full(3, np.inf)
+
+        # The problem fraction is binomial, and gets the Wilson interval. The other values are at most 1 (projected
+        # area ratio) and the height of the model (support volume per area) on problem faces. Their errors are not
+        # below the smallest fraction of problem faces that the sample could have missed, scaled by these bounds.
+        low, high = wilson_interval(mean[0], n, z_score)
+        error[0] = max(mean[0] - low, high - mean[0])
+        resolution = wilson_interval(0.0, n, z_score)[1]
+        error[1] = max(error[1], resolution)
+        error[2] = max(error[2], resolution * max(top - ground_level, 0.0))
+
+        if target_error is None or n >= max_samples:
+            break
+        if np.all(error[:2] <= target_error) and (mean[2] == 0 or error[2] <= target_error * mean[2]):
+            break
+        count = min(2 * len(values), max_samples)
+
+    return OverhangEstimate(len(values), total_area, Estimate(mean[0], error[0]),
+                            Estimate(mean[0] * total_area, error[0] * total_area),
+                            Estimate(mean[1] * total_area, error[1] * total_area),
+                            Estimate(mean[2] * total_area, error[2] * total_area), confidence)
@@ -0,0 +1,187 @@
+import numpy as np
+
+from am_stl.geometry.mass_properties import convex_hull_2d, polygon_margin
+
+
+def convex_hull_3d(points, joggle=1e-9):
+    """
+    Convex hull of a set of 3D points (quickhull).
+    Visibility tests are vectorized over all hull faces, and outside points are only re-assigned for faces
+    that are replaced.
+    CAD models contain large sets of coplanar points, which makes the hull numerically fragile. The points are
+    therefore joggled by a small random amount (deterministically), which leaves coplanar regions as several
+    nearly coplanar hull faces.
+    :param points: Array of shape (n, 3)
+    :param joggle: Size of the random perturbation, relative to the size of the point cloud.
+    :return: Array of outward wound hull faces of shape (m, 3), indexing into points.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if len(points) < 4:
+        raise ValueError("At least four points are needed to create a convex hull.")
+
+    scale = max((points.max(axis=0) - points.min(axis=0)).max(), 1e-12)
+    eps = 1e-12 * scale
+    if joggle > 0:
+        points = points + np.random.default_rng(0).uniform(-1, 1, points.shape) * joggle * scale
+
+    # Initial tetrahedron from extreme points
+    i0 = int(np.argmin(points[:, 0]))
+    i1 = int(np.argmax(np.linalg.norm(points - points[i0], axis=1)))
+    line = points[i1] - points[i0]
+    i2 = int(np.argmax(np.linalg.norm(np.cross(points - points[i0], line), axis=1)))
+    plane_normal = np.cross(line, points[i2] - points[i0])
+    plane_distance = (points - points[i0]) @ plane_normal
+    i3 = int(np.argmax(np.abs(plane_distance)))
+    if abs(plane_distance[i3]) <= eps * np.linalg.norm(plane_normal):
+        raise ValueError("Points are coplanar, a convex hull can not be created.")
+
+    if plane_distance[i3] > 0:
+        i1, i2 = i2, i1
+    faces = [[i0, i1, i2], [i0, i3, i1], [i1, i3, i2], [i2, i3, i0]]
+
+    face_array = np.array(faces, dtype=np.int64)
+    normals, offsets = _face_planes(points, face_array)
+    alive = np.ones(4, dtype=bool)
+
+    # Assign every point to the face it is furthest outside of
+    point_face, point_distance = _assign_outside(points, np.arange(len(points)), normals, offsets, np.arange(4), eps)
+
+    while True:
+        outside = np.flatnonzero(point_face >= 0)
+        if len(outside) == 0:
+            break
+        apex = outside[np.argmax(point_distance[outside])]
+
+        visible = alive & (normals @ points[apex] - offsets > eps)
+        visible_faces = face_array[visible]
+        directed = set(map(tuple, np.concatenate([visible_faces[:, [0, 1]], visible_faces[:, [1, 2]],
+                                                  visible_faces[:, [2, 0]]]).tolist()))
+        horizon = [edge for edge in directed if (edge[1], edge[0]) not in directed]
+
+        new_faces = np.array([[a, b, apex] for a, b in horizon], dtype=np.int64)
+        new_normals, new_offsets = _face_planes(points, new_faces)
+        new_ids = np.arange(len(face_array), len(face_array) + len(new_faces))
+
+        alive[visible] = False
+        face_array = np.concatenate([face_array, new_faces])
+        normals = np.concatenate([normals, new_normals])
+        offsets = np.concatenate([offsets, new_offsets])
+        alive = np.concatenate([alive, np.ones(len(new_faces), dtype=bool)])
+
+        # Points outside of removed faces are re-assigned to the new faces, or discarded if they are now inside.
+        orphans = np.flatnonzero(np.isin(point_face, np.flatnonzero(visible)))
+        point_face[orphans] = -1
+        if len(orphans) > 0:
+            orphan_face, orphan_distance = _assign_outside(points, orphans, new_normals, new_offsets, new_ids, eps)
+            point_face[orphans] = orphan_face
+            point_distance[orphans] = orphan_distance
+        point_face[apex] = -1
+
+    return face_array[alive]
+
+
+def _face_planes(points, faces):
+    """
+    Unit normals and plane offsets of a set of faces.
+    """
+    normals = np.cross(points[faces[:, 1]] - points[faces[:, 0]], points[faces[:, 2]] - points[faces[:, 0]])
+    normals /= np.linalg.norm(normals, axis=1)[:, None]
+    offsets = np.einsum('ij,ij->i', normals, points[faces[:, 0]])
+    return normals, offsets
+
+
+def _assign_outside(points, point_ids, normals, offsets, face_ids, eps):
+    """
+    Find the face that each point is furthest outside of. Points inside of all faces are assigned -1.
+    """
+    distance = points[point_ids] @ normals.T - offsets
+    best = np.argmax(distance, axis=1)
+    best_distance = distance[np.arange(len(point_ids)), best]
+    return np.where(best_distance > eps, face_ids[best], -1), best_distance
+
+
+def rotation_to_ground(normal):
+    """
+    Rotation matrix that turns a unit normal vector to point straight down (negative Z).
+    """
+    target = np.array([0.0, 0.0, -1.0])
+    normal = np.asarray(normal, dtype=np.float64)
+    normal = normal / np.linalg.norm(normal)
+    v = np.cross(normal, target)
+    c = np.dot(normal, target)
+    if c < -1 + 1e-12:
+        # The normal is pointing straight up. Turn it half a revolution around the X-axis.
+        return np.diag([1.0, -1.0, -1.0])
+    vx = np.array([
+        [0, -v[2], v[1]],
+        [v[2], 0, -v[0]],
+        [-v[1], v[0], 0]
+    ])
+    return np.eye(3) + vx + vx @ vx / (1 + c)
+
+
+class StablePose:
+    """
+    A resting orientation of a model, where one facet of its convex hull is placed on the build plate.
+    """
+
+    def __init__(self, rotation, normal, contact_area, margin):
+        self.rotation = rotation  # Rotation matrix that brings the model into this pose
+        self.normal = normal  # Outward normal of the hull facet that is placed on the build plate
+        self.contact_area = contact_area  # Area of the hull facet resting on the build plate
+        self.margin = margin  # Distance between the centre of mass and the edge of the contact polygon
+        self.stable = margin > 0
+
+    def __str__(self):
+        return "StablePose(normal={}, contact_area={}, margin={})".format(self.normal, self.contact_area, self.margin)
+
+
+def find_stable_poses(vertices, center_of_mass, angle_tolerance=0.017, distance_tolerance=None,
+                      include_unstable=False):
+    """
+    Generate candidate resting orientations from the convex hull of a model.
+    Coplanar hull facets are merged, and every merged facet is evaluated as a possible contact surface.
+    :param vertices: Array of shape (n, 3). Welded vertices reduce the work needed.
+    :param center_of_mass: Centre of mass of the model.
+    :param angle_tolerance: Max angle between two hull facet normals for them to be merged, in rads.
+    :param distance_tolerance: Max difference in plane offset for two hull facets to be merged.
+    Defaults to a millionth of the model size.
+    :param include_unstable: Include poses where the centre of mass is outside of the contact polygon.
+    :return: List of StablePose, ranked by contact area and centre of mass margin.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    center_of_mass = np.asarray(center_of_mass, dtype=np.float64)
+    if distance_tolerance is None:
+        distance_tolerance = 1e-6 * max((vertices.max(axis=0) - vertices.min(axis=0)).max(), 1.0)
+
+    hull = convex_hull_3d(vertices)
+    cross = np.cross(vertices[hull[:, 1]] - vertices[hull[:, 0]], vertices[hull[:, 2]] - vertices[hull[:, 0]])
+    hull = hull[np.linalg.norm(cross, axis=1) > 0]  # Drop slivers collapsed by the joggle
+    cross = np.cross(vertices[hull[:, 1]] - vertices[hull[:, 0]], vertices[hull[:, 2]] - vertices[hull[:, 0]])
+    areas = np.linalg.norm(cross, axis=1) / 2
+    normals = cross / np.linalg.norm(cross, axis=1)[:, None]
+    offsets = np.einsum('ij,ij->i', normals, vertices[hull[:, 0]])
+
+    # Merge coplanar facets, starting from the largest ones
+    unassigned = np.ones(len(hull), dtype=bool)
+    poses = []
+    for seed in np.argsort(-areas):
+        if not unassigned[seed]:
+            continue
+        group = unassigned & (normals @ normals[seed] >= np.cos(angle_tolerance)) \
+            & (np.abs(offsets - offsets[seed]) <= distance_tolerance)
+        unassigned[group] = False
+
+        normal = (normals[group] * areas[group][:, None]).sum(axis=0)
+        normal /= np.linalg.norm(normal)
+        rotation = rotation_to_ground(normal)
+
+        contact = vertices[np.unique(hull[group])] @ rotation[:2].T
+        margin = polygon_margin(convex_hull_2d(contact), rotation[:2] @ center_of_mass)
+        pose = StablePose(rotation, normal, areas[group].sum(), margin)
+        if pose.stable or include_unstable:
+            poses.append(pose)
+
+    # Rank stable poses first, then by contact area and margin
+    poses.sort(key=lambda p: (not p.stable, -p.contact_area, -p.margin))
+    return poses
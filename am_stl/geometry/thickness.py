@@ -0,0 +1,185 @@
+import numpy as np
+
+
+class UniformGrid:
+    """
+    Uniform grid acceleration structure over a set of triangles. Every triangle is registered in all cells that
+    its bounding box overlaps, and the cell contents are stored in compressed sparse row form.
+    Triangles whose bounding box overlaps more than max_cells_per_face cells (e.g. long diagonal triangles) are kept
+    in an overflow list instead, which is tested against every ray.
+    """
+
+    def __init__(self, triangles, cells_per_face=1.0, max_resolution=256, max_cells_per_face=1024):
+        """
+        :param triangles: Array of shape (n, 3, 3)
+        :param cells_per_face: Target number of grid cells per triangle.
+        :param max_resolution: Max number of cells along any axis.
+        :param max_cells_per_face: Max number of cells a single triangle is registered in.
+        """
+        self.triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+        lower = self.triangles.min(axis=1)
+        upper = self.triangles.max(axis=1)
+
+        size = upper.max(axis=0) - lower.min(axis=0)
+        padding = max(size.max(), 1e-9) * 1e-6
+        self.origin = lower.min(axis=0) - padding
+        size = size + 2 * padding
+
+        cell_count = max(len(self.triangles) * cells_per_face, 1)
+        cell_size = (np.prod(size) / cell_count) ** (1 / 3)
+        self.resolution = np.clip(np.ceil(size / cell_size), 1, max_resolution).astype(np.int64)
+        self.cell_size = size / self.resolution
+
+        # Cell ranges overlapped by each triangle
+        first = np.clip(np.floor((lower - self.origin) / self.cell_size), 0, self.resolution - 1).astype(np.int64)
+        last = np.clip(np.floor((upper - self.origin) / self.cell_size), 0, self.resolution - 1).astype(np.int64)
+        span = last - first + 1
+        counts = np.prod(span, axis=1)
+        overflow = counts > max_cells_per_face
+        self.overflow_triangles = np.flatnonzero(overflow)
+        counts[overflow] = 0
+
+        # Expand every triangle into one row per overlapped cell
+        triangle_ids = np.repeat(np.arange(len(self.triangles)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        span_rows = span[triangle_ids]
+        ix = first[triangle_ids, 0] + local % span_rows[:, 0]
+        iy = first[triangle_ids, 1] + (local // span_rows[:, 0]) % span_rows[:, 1]
+        iz = first[triangle_ids, 2] + local // (span_rows[:, 0] * span_rows[:, 1])
+        cells = self.flat_index(np.stack([ix, iy, iz], axis=1))
+
+        order = np.argsort(cells, kind='stable')
+        self.cell_triangles = triangle_ids[order]
+        self.cell_start = np.concatenate([[0], np.cumsum(np.bincount(cells, minlength=np.prod(self.resolution)))])
+
+    def flat_index(self, cells):
+        return (cells[:, 2] * self.resolution[1] + cells[:, 1]) * self.resolution[0] + cells[:, 0]
+
+    def cast_rays(self, origins, directions, ignore=None, max_distance=np.inf, eps=1e-9):
+        """
+        Find the first intersection of each ray, walking all rays through the grid at the same time (3D-DDA).
+        :param origins: Array of shape (k, 3)
+        :param directions: Array of shape (k, 3) of unit vectors
+        :param ignore: Array of triangle indices that each ray should not hit, e.g. the face the ray starts from.
+        :param max_distance: Rays are stopped after this distance.
+        :param eps: Hits closer than this distance are ignored.
+        :return: Distance to the first hit (inf if nothing was hit), index of the hit triangle (-1 if none)
+        """
+        origins = np.asarray(origins, dtype=np.float64).reshape(-1, 3)
+        directions = np.asarray(directions, dtype=np.float64).reshape(-1, 3)
+        ray_count = len(origins)
+        ignore = np.full(ray_count, -1) if ignore is None else np.asarray(ignore)
+
+        best_t = np.full(ray_count, np.inf)
+        best_id = np.full(ray_count, -1, dtype=np.int64)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inverse = 1 / directions
+            # Entry into the grid bounding box (slab test)
+            t0 = (self.origin - origins) * inverse
+            t1 = (self.origin + self.resolution * self.cell_size - origins) * inverse
+            t_enter = np.maximum(np.nanmax(np.minimum(t0, t1), axis=1), 0)
+            t_leave = np.nanmin(np.maximum(t0, t1), axis=1)
+
+            position = origins + directions * t_enter[:, None]
+            cell = np.clip(np.floor((position - self.origin) / self.cell_size), 0, self.resolution - 1) \
+                .astype(np.int64)
+            step = np.where(directions > 0, 1, -1)
+            t_delta = np.abs(self.cell_size * inverse)
+            boundary = self.origin + (cell + (step > 0)) * self.cell_size
+            t_max = np.where(directions != 0, (boundary - origins) * inverse, np.inf)
+
+        if len(self.overflow_triangles) > 0:
+            # The overflow triangles are not in the grid. Test them once per ray, in chunks to bound the memory.
+            chunk = max(1, 2 ** 20 // len(self.overflow_triangles))
+            for start in range(0, ray_count, chunk):
+                rays = np.repeat(np.arange(start, min(start + chunk, ray_count)), len(self.overflow_triangles))
+                triangle_ids = np.tile(self.overflow_triangles, len(rays) // len(self.overflow_triangles))
+                t = intersect_rays_triangles(origins[rays], directions[rays], self.triangles[triangle_ids])
+                t[(triangle_ids == ignore[rays]) | (t <= eps)] = np.inf
+                t = t.reshape(-1, len(self.overflow_triangles))
+                closest = np.argmin(t, axis=1)
+                t_closest = t[np.arange(len(t)), closest]
+                best_t[start:start + len(t)] = t_closest
+                best_id[start:start + len(t)] = np.where(np.isinf(t_closest), -1, self.overflow_triangles[closest])
+
+        active = np.flatnonzero((t_enter <= t_leave) & (t_enter <= max_distance))
+        while len(active) > 0:
+            # Test all triangles registered in the current cell of each active ray
+            flat = self.flat_index(cell[active])
+            counts = self.cell_start[flat + 1] - self.cell_start[flat]
+            rays = np.repeat(active, counts)
+            local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            triangle_ids = self.cell_triangles[np.repeat(self.cell_start[flat], counts) + local]
+
+            t = intersect_rays_triangles(origins[rays], directions[rays], self.triangles[triangle_ids])
+            t[(triangle_ids == ignore[rays]) | (t <= eps)] = np.inf
+            closer = t < best_t[rays]
+            if np.any(closer):
+                # Keep the closest hit of every ray
+                hit_order = np.lexsort((t[closer], rays[closer]))
+                hit_rays = rays[closer][hit_order]
+                first_hit = np.concatenate([[True], hit_rays[1:] != hit_rays[:-1]])
+                best_t[hit_rays[first_hit]] = t[closer][hit_order][first_hit]
+                best_id[hit_rays[first_hit]] = triangle_ids[closer][hit_order][first_hit]
+
+            # Step to the next cell. Rays are done when their best hit is before the next cell.
+            axis = np.argmin(t_max[active], axis=1)
+            t_next = t_max[active, axis]
+            cell[active, axis] += step[active, axis]
+            t_max[active, axis] += t_delta[active, axis]
+
+            inside = (cell[active, axis] >= 0) & (cell[active, axis] < self.resolution[axis])
+            keep = inside & (t_next < best_t[active]) & (t_next <= max_distance)
+            active = active[keep]
+
+        best_t[best_t > max_distance] = np.inf
+        best_id[np.isinf(best_t)] = -1
+        return best_t, best_id
+
+
+def intersect_rays_triangles(origins, directions, triangles):
+    """
+    Vectorized Moller-Trumbore intersection of ray i with triangle i.
+    :return: Distance along each ray to the intersection, inf where the ray misses.
+    """
+    edge1 = triangles[:, 1] - triangles[:, 0]
+    edge2 = triangles[:, 2] - triangles[:, 0]
+    p = np.cross(directions, edge2)
+    determinant = np.einsum('ij,ij->i', edge1, p)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1 / determinant
+        s = origins - triangles[:, 0]
+        u = np.einsum('ij,ij->i', s, p) * inverse
+        q = np.cross(s, edge1)
+        v = np.einsum('ij,ij->i', directions, q) * inverse
+        t = np.einsum('ij,ij->i', edge2, q) * inverse
+        hit = (np.abs(determinant) > 1e-12) & (u >= 0) & (v >= 0) & (u + v <= 1)
+    return np.where(hit, t, np.inf)
+
+
+def calculate_wall_thickness(triangles, max_distance=np.inf, batch_size=100000):
+    """
+    Local wall thickness at each face, measured by casting a ray from the face centroid in the direction
+    opposite to its normal, until it leaves the material through another face.
+    :param triangles: Array of shape (n, 3, 3). The mesh needs to be closed and consistently wound.
+    :param max_distance: Rays are stopped after this distance, which speeds up the analysis.
+    Faces without a hit within this distance get an infinite thickness.
+    :param batch_size: Number of rays that are cast at the same time. Limits the memory use.
+    :return: Array of thickness per face
+    """
+    triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    grid = UniformGrid(triangles)
+
+    n = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    length = np.linalg.norm(n, axis=1)
+    directions = -n / np.where(length > 0, length, 1)[:, None]
+    centroids = triangles.mean(axis=1)
+
+    thickness = np.full(len(triangles), np.inf)
+    for start in range(0, len(triangles), batch_size):
+        batch = np.arange(start, min(start + batch_size, len(triangles)))
+        batch = batch[length[batch] > 0]  # Degenerate faces have no direction
+        thickness[batch], _ = grid.cast_rays(centroids[batch], directions[batch], ignore=batch,
+                                             max_distance=max_distance)
+    return thickness
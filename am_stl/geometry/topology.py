@@ -0,0 +1,244 @@
+import numpy as np
+
+
+class EdgeTable:
+    """
+    Every face edge of an indexed mesh, grouped by undirected edge in one sort pass.
+    Edge k of face f (k = 0, 1, 2) runs from vertex k to vertex (k + 1) % 3 of the face, and is found at row
+    3 * f + k of the directed edge arrays.
+    """
+
+    def __init__(self, faces):
+        faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+        self.faces = faces
+        self.directed = faces[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+        self.face_of_edge = np.repeat(np.arange(len(faces)), 3)
+        self.forward = self.directed[:, 0] < self.directed[:, 1]  # True if the edge runs from low to high index
+
+        low = self.directed.min(axis=1)
+        high = self.directed.max(axis=1)
+        code = low * (max(int(faces.max(initial=0)), 0) + 1) + high
+
+        # Directed edges sorted so that uses of the same undirected edge are consecutive
+        self.order = np.argsort(code, kind='stable')
+        _, self.start, self.counts = np.unique(code[self.order], return_index=True, return_counts=True)
+        self.edges = np.stack([low, high], axis=1)[self.order[self.start]]  # Unique undirected edges
+
+    def get_manifold_pairs(self):
+        """
+        Face pairs sharing an edge that is used by exactly two faces.
+        :return: Array of shape (k, 2) with face indices, and a boolean array that is True if both faces traverse
+        the edge in the same direction, meaning their winding is inconsistent.
+        """
+        start = self.start[self.counts == 2]
+        first = self.order[start]
+        second = self.order[start + 1]
+        pairs = np.stack([self.face_of_edge[first], self.face_of_edge[second]], axis=1)
+        return pairs, self.forward[first] == self.forward[second]
+
+
+class WindingReport:
+    """
+    Result of a winding consistency check.
+    """
+
+    def __init__(self, flipped, normal_mismatches, components, conflicts):
+        self.flipped = flipped  # Indices of faces whose winding was inverted
+        self.normal_mismatches = normal_mismatches  # Indices of faces whose stored normal disagreed with the winding
+        self.components = components  # Number of connected components
+        self.conflicts = conflicts  # Number of edges where no consistent winding exists (non-orientable mesh)
+
+    def __str__(self):
+        return "WindingReport(flipped={}, normal_mismatches={}, components={}, conflicts={})".format(
+            len(self.flipped), len(self.normal_mismatches), self.components, self.conflicts)
+
+
+def orient_faces(vertices, faces, stored_normals=None) -> WindingReport:
+    """
+    Find faces with inconsistent winding.
+    Faces are joined into connected components with a vectorized union-find over the face adjacency, which also
+    tracks whether each face needs the opposite flip state of its root. The orientation of each connected component
+    is then decided by an area weighted vote of the stored normals, or by the sign of the enclosed volume if there
+    are no stored normals.
+    :param vertices: Array of shape (n, 3)
+    :param faces: Array of shape (m, 3). Vertices need to be welded for faces to be adjacent.
+    :param stored_normals: Array of shape (m, 3) with the normals stored in the file, or None.
+    :return: WindingReport
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    face_count = len(faces)
+
+    pairs, inconsistent = EdgeTable(faces).get_manifold_pairs()
+    first = pairs[:, 0]
+    second = pairs[:, 1]
+
+    # Every face points to a parent face with a lower index, and parity is True if it needs the opposite flip
+    # state of the parent. Roots point to themselves, and are the lowest face index of their component.
+    parent = np.arange(face_count)
+    parity = np.zeros(face_count, dtype=bool)
+    while True:
+        # Point every face directly to its root
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parity ^= parity[parent]
+            parent = grandparent
+
+        # Hook the higher root of every edge between two trees to the lower root, once per root
+        root_first = parent[first]
+        root_second = parent[second]
+        crossing = np.flatnonzero(root_first != root_second)
+        if len(crossing) == 0:
+            break
+        high = np.maximum(root_first[crossing], root_second[crossing])
+        low = np.minimum(root_first[crossing], root_second[crossing])
+        relation = parity[first[crossing]] ^ parity[second[crossing]] ^ inconsistent[crossing]
+        high, unique_index = np.unique(high, return_index=True)
+        parent[high] = low[unique_index]
+        parity[high] = relation[unique_index]
+
+    flip = parity
+    roots, component = np.unique(parent, return_inverse=True)
+    component = component.reshape(-1)
+    component_count = len(roots)
+    # Edges where the two faces disagree with the required relation, there is no consistent winding
+    conflicts = int(np.count_nonzero(flip[first] ^ flip[second] ^ inconsistent))
+
+    # Normals after propagation, with the seed of each component kept as it is
+    triangles = vertices[faces]
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    propagated = np.where(flip[:, None], -cross, cross)
+
+    # Decide the orientation of every component
+    if stored_normals is not None:
+        votes = np.einsum('ij,ij->i', propagated, np.asarray(stored_normals, dtype=np.float64).reshape(-1, 3))
+        component_votes = np.bincount(component, weights=votes, minlength=component_count)
+    else:
+        component_votes = np.zeros(component_count)
+    volumes = np.einsum('ij,ij->i', triangles[:, 0], propagated) / 6
+    component_volumes = np.bincount(component, weights=volumes, minlength=component_count)
+
+    scale = np.bincount(component, weights=np.linalg.norm(cross, axis=1), minlength=component_count)
+    decisive = np.abs(component_votes) > 1e-6 * scale
+    flip_component = np.where(decisive, component_votes < 0, component_volumes < 0)
+    flip ^= flip_component[component]
+
+    # Stored normals that disagree with the final winding
+    if stored_normals is not None:
+        final = np.where(flip[:, None], -cross, cross)
+        stored_votes = np.einsum('ij,ij->i', final, np.asarray(stored_normals, dtype=np.float64).reshape(-1, 3))
+        normal_mismatches = np.flatnonzero(stored_votes < 0)
+    else:
+        normal_mismatches = np.zeros(0, dtype=np.int64)
+
+    return WindingReport(np.flatnonzero(flip), normal_mismatches, component_count, conflicts)
+
+
+class TopologyReport:
+    """
+    Full mesh topology report, computed from edge use counts in one sort pass.
+    All results are index arrays, so that they can be used directly to repair the mesh or to skip faces.
+    """
+
+    def __init__(self, boundary_edges, boundary_loops, non_manifold_edges, non_manifold_faces, duplicate_faces,
+                 degenerate_faces):
+        self.boundary_edges = boundary_edges  # (k, 2) vertex indices of edges used by one face only
+        self.boundary_loops = boundary_loops  # List of vertex index arrays, one per hole
+        self.non_manifold_edges = non_manifold_edges  # (k, 2) vertex indices of edges used by more than two faces
+        self.non_manifold_faces = non_manifold_faces  # Indices of faces using a non-manifold edge
+        self.duplicate_faces = duplicate_faces  # Indices of faces that repeat an earlier face
+        self.degenerate_faces = degenerate_faces  # Indices of faces with zero area
+
+    def is_closed(self):
+        return len(self.boundary_edges) == 0
+
+    def is_manifold(self):
+        return len(self.non_manifold_edges) == 0
+
+    def get_faces_to_skip(self):
+        """
+        Indices of all faces that are duplicated, degenerate or attached to a non-manifold edge.
+        """
+        return np.union1d(np.union1d(self.duplicate_faces, self.degenerate_faces), self.non_manifold_faces)
+
+    def __str__(self):
+        return "TopologyReport(boundary_edges={}, holes={}, non_manifold_edges={}, duplicate_faces={}, " \
+               "degenerate_faces={})".format(len(self.boundary_edges), len(self.boundary_loops),
+                                             len(self.non_manifold_edges), len(self.duplicate_faces),
+                                             len(self.degenerate_faces))
+
+
+def check_topology(vertices, faces, area_tolerance=0.0) -> TopologyReport:
+    """
+    Find boundary edges and the holes they form, non-manifold edges, duplicate faces and degenerate faces.
+    Unlike loading with edges, this does not stop at the first problem.
+    :param vertices: Array of shape (n, 3)
+    :param faces: Array of shape (m, 3). Vertices need to be welded for faces to be adjacent.
+    :param area_tolerance: Faces with an area at or below this value are degenerate.
+    :return: TopologyReport
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3)
+    table = EdgeTable(faces)
+
+    # Degenerate faces: repeated vertex indices, or no area
+    triangles = vertices[faces]
+    area = np.linalg.norm(np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]), axis=1) / 2
+    repeated = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 2] == faces[:, 0])
+    degenerate_faces = np.flatnonzero(repeated | (area <= area_tolerance))
+
+    # Duplicate faces, independent of winding and start vertex
+    _, first, inverse = np.unique(np.sort(faces, axis=1), axis=0, return_index=True, return_inverse=True)
+    duplicate_faces = np.flatnonzero(first[inverse.reshape(-1)] != np.arange(len(faces)))
+
+    # Non-manifold edges, and the faces using them
+    non_manifold = np.flatnonzero(table.counts > 2)
+    non_manifold_edges = table.edges[non_manifold]
+    edge_of_use = np.repeat(np.arange(len(table.counts)), table.counts)
+    uses = table.order[np.isin(edge_of_use, non_manifold)]
+    non_manifold_faces = np.unique(table.face_of_edge[uses])
+
+    # Boundary edges, kept in the direction of their face so that they can be chained into loops
+    boundary_uses = table.order[table.start[table.counts == 1]]
+    boundary_directed = table.directed[boundary_uses]
+    boundary_edges = table.edges[table.counts == 1]
+
+    return TopologyReport(boundary_edges, chain_loops(boundary_directed), non_manifold_edges, non_manifold_faces,
+                          duplicate_faces, degenerate_faces)
+
+
+def chain_loops(directed_edges):
+    """
+    Chain directed edges into loops, following each edge with an edge that starts where it ends.
+    :param directed_edges: Array of shape (k, 2) with vertex indices
+    :return: List of vertex index arrays. Chains that can not be closed are returned as open chains.
+    """
+    directed_edges = np.asarray(directed_edges, dtype=np.int64).reshape(-1, 2)
+    if len(directed_edges) == 0:
+        return []
+
+    # Successor of every edge, found with a binary search over the edges sorted by start vertex
+    order = np.argsort(directed_edges[:, 0], kind='stable')
+    starts = directed_edges[order, 0]
+    position = np.searchsorted(starts, directed_edges[:, 1])
+    found = (position < len(starts)) & (starts[np.minimum(position, len(starts) - 1)] == directed_edges[:, 1])
+    successor = np.where(found, order[np.minimum(position, len(starts) - 1)], -1).tolist()
+
+    # Open chains are followed from their first edge, before closed loops are collected
+    has_predecessor = np.zeros(len(directed_edges), dtype=bool)
+    has_predecessor[[s for s in successor if s != -1]] = True
+    visited = [False] * len(directed_edges)
+    loops = []
+    for first in np.argsort(has_predecessor, kind='stable').tolist():
+        if visited[first]:
+            continue
+        loop = []
+        edge = first
+        while edge != -1 and not visited[edge]:
+            visited[edge] = True
+            loop.append(edge)
+            edge = successor[edge]
+        loops.append(directed_edges[loop, 0])
+    return loops
@@ -1,6 +1,25 @@
 import numpy as np
 
 
+def weld_vertices(vertices, tolerance):
+    """
+    Merge vertices that are in proximity of each other, in one vectorized pass.
+    Vertices are snapped to a grid with the spacing of the tolerance, and vertices sharing a grid cell are merged.
+    Unlike VertexCollection this is done in O(n log n) time, at the cost of occasionally keeping two vertices
+    that are in proximity but fall on different sides of a grid line.
+    :param vertices: Array of shape (n, 3)
+    :param tolerance: Grid spacing. Set to 0 to only merge identical vertices.
+    :return: Array of unique vertices, and an array mapping each input vertex to its unique vertex.
+    """
+    vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    if tolerance > 0:
+        keys = np.round(vertices / tolerance).astype(np.int64)
+    else:
+        keys = vertices
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return vertices[first], inverse.reshape(-1)
+
+
 class VertexCollection(set):
 
     enforce_strict_vertex_policy = True
@@ -56,13 +75,13 @@ class Vertex:
         self.is_pole = True  # True if all adjacent vertices are above this vertex.
 
     def x(self):
-        return self.facecol.stlfile.vertices[self.index][0]
+        return float(self.facecol.stlfile.vertices[self.index, 0])
 
     def y(self):
-        return self.facecol.stlfile.vertices[self.index][1]
+        return float(self.facecol.stlfile.vertices[self.index, 1])
 
     def z(self):
-        return self.facecol.stlfile.vertices[self.index][2]
+        return float(self.facecol.stlfile.vertices[self.index, 2])
 
     def __str__(self):
         return "VX({}, {}, {})".format(self.x(), self.y(), self.z())
@@ -91,15 +110,17 @@ class Vertex:
 
     def get_array(self):
         """
-        Returns the vertex as a coordinate vector in the form of a numpy array
+        Returns the vertex as a float64 coordinate vector in the form of a numpy array, whatever the storage precision
         """
-        return np.array(self.facecol.stlfile.vertices[self.index])
+        return self.facecol.stlfile.vertices[self.index].astype(np.float64)
 
     def set_array(self, array):
         """
         Set the coordinate value of the vertex using a R^3 array
         """
         self.facecol.stlfile.vertices[self.index] = array
+        self.facecol.stlfile.geometry_version += 1
+        self.facecol.stlfile.shape_version += 1
 
     def set_adjacency(self, vertex):
         self.adjacencies.add(vertex)
@@ -0,0 +1,256 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class VoxelGrid:
+    """
+    Solid voxelization of a closed mesh. Voxel (i, j, k) is centred at origin + (i + 0.5, j + 0.5, k + 0.5) * voxel_size.
+    """
+
+    def __init__(self, occupied, origin, voxel_size):
+        self.occupied = occupied  # Boolean array of shape (nx, ny, nz), True for material
+        self.origin = origin  # Corner of the grid
+        self.voxel_size = voxel_size
+        self._cavities = None  # Cached result of find_cavities()
+
+    def get_volume(self):
+        return int(self.occupied.sum()) * self.voxel_size ** 3
+
+    def index_to_point(self, indices):
+        """
+        Coordinates of the centre of voxels, given as an array of shape (k, 3) of indices.
+        """
+        return self.origin + (np.asarray(indices) + 0.5) * self.voxel_size
+
+    def find_cavities(self):
+        """
+        Empty regions that are not connected to the outside of the grid, e.g. trapped powder. Cached on the grid.
+        :return: List of Cavity, largest first
+        """
+        if self._cavities is None:
+            self._cavities = find_cavities(self)
+        return self._cavities
+
+
+class Cavity:
+    """
+    Enclosed void with no escape path to the outside of the part.
+    """
+
+    def __init__(self, voxel_count, volume, bounds_min, bounds_max):
+        self.voxel_count = voxel_count
+        self.volume = volume  # Volume of the voxels in the cavity
+        self.bounds_min = bounds_min  # Lower corner of the bounding box
+        self.bounds_max = bounds_max  # Upper corner of the bounding box
+
+    def __str__(self):
+        return "Cavity(volume={}, bounds_min={}, bounds_max={})".format(self.volume, self.bounds_min.tolist(),
+                                                                        self.bounds_max.tolist())
+
+
+def voxelize(triangles, voxel_size, chunk_size=1000000) -> VoxelGrid:
+    """
+    Voxelize a closed mesh with scanline parity filling. A vertical scanline is cast through the centre of every
+    (x, y) column, and the crossings with the mesh toggle the inside state of the voxels above them.
+    :param triangles: Array of shape (n, 3, 3)
+    :param voxel_size: Edge length of a voxel
+    :param chunk_size: Max number of (triangle, column) pairs processed at the same time. Limits the memory use.
+    :return: VoxelGrid
+    """
+    triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    lower = triangles.reshape(-1, 3).min(axis=0)
+    upper = triangles.reshape(-1, 3).max(axis=0)
+    shape = np.maximum(np.ceil((upper - lower) / voxel_size), 1).astype(np.int64)
+    origin = lower - (shape * voxel_size - (upper - lower)) / 2  # Centre the mesh in the grid
+    nx, ny, nz = shape.tolist()
+
+    # Scanlines are moved by a tiny fraction of a voxel, so that they do not pass exactly through shared edges
+    # and vertices of axis aligned models, where crossings would be counted twice.
+    jitter = np.array([1.2345e-6, 2.3456e-6]) * voxel_size
+
+    # Column range covered by the (x, y) bounding box of each triangle
+    tri_lower = triangles[:, :, :2].min(axis=1)
+    tri_upper = triangles[:, :, :2].max(axis=1)
+    first = np.maximum(np.ceil((tri_lower - origin[:2] - jitter) / voxel_size - 0.5), 0).astype(np.int64)
+    last = np.minimum(np.floor((tri_upper - origin[:2] - jitter) / voxel_size - 0.5), shape[:2] - 1).astype(np.int64)
+    span = np.maximum(last - first + 1, 0)
+    counts = span[:, 0] * span[:, 1]
+
+    toggles = np.zeros((nx * ny, nz), dtype=np.uint8)
+    total = np.cumsum(counts)
+    splits = np.searchsorted(total, np.arange(chunk_size, total[-1] if len(total) else 0, chunk_size))
+    for chunk in np.split(np.arange(len(triangles)), splits):
+        chunk = chunk[counts[chunk] > 0]
+        if len(chunk) == 0:
+            continue
+
+        # One row per (triangle, column) pair
+        ids = np.repeat(chunk, counts[chunk])
+        local = np.arange(len(ids)) - np.repeat(np.cumsum(counts[chunk]) - counts[chunk], counts[chunk])
+        ix = first[ids, 0] + local % span[ids, 0]
+        iy = first[ids, 1] + local // span[ids, 0]
+        px = origin[0] + (ix + 0.5) * voxel_size + jitter[0]
+        py = origin[1] + (iy + 0.5) * voxel_size + jitter[1]
+
+        # Barycentric coordinates of the scanline in the (x, y) projection of the triangle
+        t = triangles[ids]
+        x1, y1, z1 = t[:, 0, 0], t[:, 0, 1], t[:, 0, 2]
+        x2, y2, z2 = t[:, 1, 0], t[:, 1, 1], t[:, 1, 2]
+        x3, y3, z3 = t[:, 2, 0], t[:, 2, 1], t[:, 2, 2]
+        d = (y2 - y3) * (x1 - x3) + (x3 - x2) * (y1 - y3)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            l1 = ((y2 - y3) * (px - x3) + (x3 - x2) * (py - y3)) / d
+            l2 = ((y3 - y1) * (px - x3) + (x1 - x3) * (py - y3)) / d
+        l3 = 1 - l1 - l2
+        hit = (d != 0) & (l1 >= 0) & (l2 >= 0) & (l3 >= 0)
+
+        # The crossing toggles every voxel whose centre is above it. Crossings above the grid toggle nothing.
+        z = l1[hit] * z1[hit] + l2[hit] * z2[hit] + l3[hit] * z3[hit]
+        k = np.clip(np.ceil((z - origin[2]) / voxel_size - 0.5), 0, nz).astype(np.int64)
+        below = k < nz
+        np.bitwise_xor.at(toggles, ((ix[hit] * ny + iy[hit])[below], k[below]), 1)
+
+    # Filled in place, so that the grid is only held once, at one byte per voxel
+    np.bitwise_xor.accumulate(toggles, axis=1, out=toggles)
+    occupied = toggles.view(bool).reshape(nx, ny, nz)
+    return VoxelGrid(occupied, origin, voxel_size)
+
+
+def find_runs(mask, chunk_size=1 << 24):
+    """
+    Runs of True voxels along the last axis of a 3D boolean mask. The columns are processed in chunks, so that the
+    temporary memory is bounded by chunk_size voxels, whatever the size of the grid.
+    :param mask: Boolean array of shape (nx, ny, nz)
+    :param chunk_size: Max number of voxels processed at the same time.
+    :return: Column of every run (index over the first two axes, x * ny + y), start and end (exclusive) along the last
+    axis. Runs are ordered by column, then by start.
+    """
+    nz = mask.shape[-1]
+    columns = mask.reshape(-1, nz)
+    rows = max(chunk_size // max(nz, 1), 1)
+    column, start, end = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int32)], [np.zeros(0, dtype=np.int32)]
+    padded = np.zeros((min(rows, len(columns)), nz + 2), dtype=np.int8)
+    for first in range(0, len(columns), rows):
+        chunk = columns[first:first + rows]
+        padded[:len(chunk), 1:-1] = chunk
+        edges = np.diff(padded[:len(chunk)], axis=1)
+        c, s = np.nonzero(edges == 1)
+        e = np.nonzero(edges == -1)[1]
+        column.append(c + first)
+        start.append(s.astype(np.int32))
+        end.append(e.astype(np.int32))
+    return np.concatenate(column), np.concatenate(start), np.concatenate(end)
+
+
+def label_runs(runs, shape):
+    """
+    Label the 6-connected regions formed by runs along the last axis, see find_runs(). Runs of neighbouring columns
+    that overlap are joined by hooking and pointer jumping over the run adjacency graph. Only per run arrays are
+    created, so the memory grows with the surface of the regions rather than with the grid.
+    :param runs: Column, start and end of every run, ordered by column and start
+    :param shape: Shape of the grid
+    :return: Label of every run. Labels are run indices, not consecutive.
+    """
+    column, start, end = runs
+    ny, nz = shape[1], shape[2]
+
+    # Runs are placed on one line, with the columns nz + 1 apart so that runs of different columns never overlap
+    line_start = column * (nz + 1) + start
+    line_end = column * (nz + 1) + end
+
+    # Runs that overlap a run of the next column along the first two axes. The runs of the next column are moved
+    # onto the column, and the overlapping ones are found by binary search, since the runs of a column are disjoint.
+    pairs = []
+    for axis, step in ((0, ny), (1, 1)):
+        lo = np.searchsorted(line_end - step * (nz + 1), line_start, side='right')
+        hi = np.searchsorted(line_start - step * (nz + 1), line_end, side='left')
+        count = np.maximum(hi - lo, 0)
+        a = np.repeat(np.arange(len(column)), count)
+        b = np.repeat(lo, count) + np.arange(len(a)) - np.repeat(np.cumsum(count) - count, count)
+        if axis == 1:
+            # The next column along y of the last column of a row is in the next row
+            keep = column[a] % ny != ny - 1
+            a, b = a[keep], b[keep]
+        pairs.append(np.stack([a, b], axis=1))
+    pairs = np.concatenate(pairs)
+
+    # Connected components of the run graph. Every root is hooked to the smallest root it is connected to.
+    parent = np.arange(len(column))
+    while True:
+        root_a = parent[pairs[:, 0]]
+        root_b = parent[pairs[:, 1]]
+        unequal = root_a != root_b
+        if not np.any(unequal):
+            break
+        np.minimum.at(parent, np.maximum(root_a, root_b)[unequal], np.minimum(root_a, root_b)[unequal])
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+
+    return parent
+
+
+def find_cavities(grid) -> list:
+    """
+    Find enclosed voids in a voxel grid. The grid is padded with one layer of empty voxels, so that all empty voxels
+    connected to the outside form a single region. Regions are labelled as runs, see label_runs().
+    :param grid: VoxelGrid
+    :return: List of Cavity, largest first
+    """
+    empty = np.pad(~grid.occupied, 1, constant_values=True)
+    shape = empty.shape
+    column, start, end = find_runs(empty)
+    del empty
+    labels = label_runs((column, start, end), shape)
+    outside = labels[0]  # The first run starts at the padded corner
+
+    cavity = labels != outside
+    if not np.any(cavity):
+        return []
+    cavity_labels, inverse = np.unique(labels[cavity], return_inverse=True)
+    inverse = inverse.reshape(-1)
+    voxel_counts = np.bincount(inverse, weights=(end - start)[cavity]).astype(np.int64)
+    x, y = np.divmod(column[cavity], shape[1])
+    index_min = np.full((len(cavity_labels), 3), np.iinfo(np.int64).max)
+    index_max = np.full((len(cavity_labels), 3), -1)
+    np.minimum.at(index_min, inverse, np.stack([x, y, start[cavity]], axis=1))
+    np.maximum.at(index_max, inverse, np.stack([x, y, end[cavity] - 1], axis=1))
+
+    # Remove the padding from the indices
+    bounds_min = grid.origin + (index_min - 1) * grid.voxel_size
+    bounds_max = grid.origin + index_max * grid.voxel_size
+
+    cavities = [Cavity(int(c), int(c) * grid.voxel_size ** 3, bounds_min[i], bounds_max[i])
+                for i, c in enumerate(voxel_counts)]
+    return sorted(cavities, key=lambda cavity: -cavity.voxel_count)
+
+
+class VoxelCache:
+    """
+    Voxel grids of recently checked orientations, keyed by the voxel size and a hash of the vertex coordinates.
+    The least recently used grid is dropped when the cache is full.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self.grids = OrderedDict()
+
+    def get(self, triangles, voxel_size) -> VoxelGrid:
+        """
+        Fetch the voxel grid of a mesh, voxelizing it if it is not cached.
+        """
+        triangles = np.ascontiguousarray(triangles, dtype=np.float64)
+        key = (voxel_size, hashlib.sha1(triangles.tobytes()).hexdigest())
+        if key in self.grids:
+            self.grids.move_to_end(key)
+            return self.grids[key]
+
+        grid = voxelize(triangles, voxel_size)
+        self.grids[key] = grid
+        if len(self.grids) > self.max_entries:
+            self.grids.popitem(last=False)
+        return grid
@@ -0,0 +1,67 @@
+import numpy as np
+
+
+class ZOrder:
+    """
+    Faces ordered from the top down, by their highest and by their lowest Z coordinate.
+    Used for sweeping a horizontal plane down through the model, e.g. for layer based checks or for propagating
+    support from the top.
+    """
+
+    def __init__(self, z_min, z_max):
+        """
+        :param z_min: Lowest Z coordinate of every face
+        :param z_max: Highest Z coordinate of every face
+        """
+        self.z_min = np.asarray(z_min, dtype=np.float64)
+        self.z_max = np.asarray(z_max, dtype=np.float64)
+        self.by_top = np.argsort(-self.z_max, kind='stable')  # Face indices, highest top first
+        self.by_bottom = np.argsort(-self.z_min, kind='stable')  # Face indices, highest bottom first
+        self._top_sorted = self.z_max[self.by_top]
+        self._bottom_sorted = self.z_min[self.by_bottom]
+
+    def get_active(self, z):
+        """
+        Indices of the faces that are cut by, or touch, the plane at height z.
+        """
+        return np.flatnonzero((self.z_min <= z) & (self.z_max >= z))
+
+    def sweep(self, step=None, levels=None):
+        """
+        Move a horizontal plane down through the model, and report the faces that it reaches and leaves.
+        A face enters when the plane reaches its top, and leaves when the plane has passed below its bottom.
+        :param step: Distance between planes, starting at the top of the model. Used if levels is None.
+        :param levels: Plane heights in descending order.
+        :return: Generator of (z, entering face indices, leaving face indices)
+        :raises ValueError: If neither step nor levels is given, or step is not positive.
+        """
+        if levels is None:
+            if step is None or step <= 0:
+                raise ValueError('sweep() needs a positive step or a list of levels.')
+            if len(self.z_max) == 0:
+                return
+            top = self.z_max.max()
+            levels = top - step * np.arange(int(np.floor((top - self.z_min.min()) / step)) + 2)
+        levels = np.asarray(levels, dtype=np.float64)
+
+        # Number of faces whose top is at or above each level, and whose bottom is above it
+        entered = np.searchsorted(-self._top_sorted, -levels, side='right')
+        left = np.searchsorted(-self._bottom_sorted, -levels, side='left')
+        entered_before = 0
+        left_before = 0
+        for z, entered_count, left_count in zip(levels.tolist(), entered.tolist(), left.tolist()):
+            yield z, self.by_top[entered_before:entered_count], self.by_bottom[left_before:left_count]
+            entered_before = max(entered_before, entered_count)
+            left_before = max(left_before, left_count)
+
+    def events(self):
+        """
+        Event queue of the sweep, one event per face top and per face bottom, in descending Z order.
+        At equal heights faces enter before they leave.
+        :return: Generator of (z, face index, True when entering and False when leaving)
+        """
+        z = np.concatenate([self.z_max, self.z_min])
+        faces = np.concatenate([np.arange(len(self.z_max)), np.arange(len(self.z_min))])
+        entering = np.concatenate([np.ones(len(self.z_max), dtype=bool), np.zeros(len(self.z_min), dtype=bool)])
+        order = np.lexsort((~entering, -z))
+        yield from zip(z[order].tolist(), faces[order].tolist(), entering[order].tolist())
@@ -0,0 +1,61 @@
+import json
+import socket
+
+
+class ServiceClient:
+    """
+    Minimal blocking client for the analysis service, see AnalysisService.
+    """
+
+    def __init__(self, address, timeout=60):
+        """
+        :param address: Path of a Unix socket, or (host, port) of a localhost TCP socket.
+        :param timeout: Socket timeout in seconds.
+        """
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            address = tuple(address)
+        self.socket.settimeout(timeout)
+        self.socket.connect(address)
+        self.stream = self.socket.makefile('rwb')
+        self.request_id = 0
+
+    def request(self, op, **params):
+        """
+        Send one request and wait for its response.
+        :return: The result dict of the response
+        """
+        self.request_id += 1
+        self.stream.write(json.dumps(dict(params, op=op, id=self.request_id)).encode('utf-8') + b'\n')
+        self.stream.flush()
+        response = json.loads(self.stream.readline())
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+        return response['result']
+
+    def load(self, filename):
+        return self.request('load', filename=filename)
+
+    def rotate(self, mesh_id, **params):
+        return self.request('rotate', mesh_id=mesh_id, **params)
+
+    def analyse(self, mesh_id, **params):
+        return self.request('analyse', mesh_id=mesh_id, **params)
+
+    def export(self, mesh_id, filename, **params):
+        return self.request('export', mesh_id=mesh_id, filename=filename, **params)
+
+    def shutdown(self):
+        return self.request('shutdown')
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,344 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from am_stl.geometry.overhangs import calculate_overhangs
+from am_stl.stl.file_types import load_part_triangles
+from am_stl.stl.stl_builder import triangles_to_records
+from am_stl.stl.stl_colors import OK_COLOR, PROBLEM_COLOR, encode_colors
+
+
+class CachedMesh:
+    """
+    A loaded model, kept as a triangle array together with its current rotation.
+    """
+
+    def __init__(self, mesh_id, filename, triangles):
+        self.mesh_id = mesh_id
+        self.filename = filename
+        self.triangles = triangles  # Array of shape (n, 3, 3) in the loaded orientation
+        self.rotation = np.eye(3)  # Rotation applied by rotate requests
+
+    def get_triangles(self):
+        return self.triangles @ self.rotation.T
+
+    def get_size(self):
+        return self.triangles.nbytes
+
+    def describe(self):
+        triangles = self.get_triangles().reshape(-1, 3)
+        return {
+            'mesh_id': self.mesh_id,
+            'faces': len(self.triangles),
+            'ground_level': float(triangles[:, 2].min()) if len(triangles) else 0.0,
+            'bounds_min': triangles.min(axis=0).tolist() if len(triangles) else [0, 0, 0],
+            'bounds_max': triangles.max(axis=0).tolist() if len(triangles) else [0, 0, 0],
+            'rotation': self.rotation.tolist()
+        }
+
+
+class MeshCache:
+    """
+    Least recently used cache of loaded models, bounded by the memory of their triangle arrays.
+    """
+
+    def __init__(self, max_bytes=1 << 30):
+        self.max_bytes = max_bytes
+        self.meshes = OrderedDict()
+        self.size = 0
+
+    def get(self, mesh_id) -> CachedMesh:
+        if mesh_id not in self.meshes:
+            raise KeyError(f'Unknown mesh_id {mesh_id}, load the model first.')
+        self.meshes.move_to_end(mesh_id)
+        return self.meshes[mesh_id]
+
+    def put(self, mesh):
+        if mesh.mesh_id in self.meshes:
+            self.size -= self.meshes.pop(mesh.mesh_id).get_size()
+        self.meshes[mesh.mesh_id] = mesh
+        self.size += mesh.get_size()
+        while self.size > self.max_bytes and len(self.meshes) > 1:
+            _, evicted = self.meshes.popitem(last=False)
+            self.size -= evicted.get_size()
+
+    def __contains__(self, mesh_id):
+        return mesh_id in self.meshes
+
+
+def get_default_socket_path():
+    """
+    Unix socket of the service when no address is given, one per user.
+    """
+    return os.path.join(tempfile.gettempdir(), f'am_stl-{os.getuid()}.sock')
+
+
+def get_mesh_id(filename):
+    """
+    Id of a model file. It changes when the file is modified, so that a cached model is never stale.
+    """
+    stat = os.stat(filename)
+    key = f'{os.path.abspath(filename)}:{stat.st_mtime_ns}:{stat.st_size}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+def rotation_matrix(theta, axis):
+    """
+    Right handed rotation matrix around the X, Y or Z axis. The X and Y matrices are the ones STLfile.rotate() uses.
+    STLfile.rotate() does not rotate around Z, use STLfile.transform(rotation_matrix(theta, 'z')) instead.
+    """
+    c, s = np.cos(theta), np.sin(theta)
+    matrices = {
+        'x': [[1, 0, 0], [0, c, -s], [0, s, c]],
+        'y': [[c, 0, s], [0, 1, 0], [-s, 0, c]],
+        'z': [[c, -s, 0], [s, c, 0], [0, 0, 1]]
+    }
+    if axis.lower() not in matrices:
+        raise TypeError('Value of axis needs to be the string value of x, y, or z.')
+    return np.array(matrices[axis.lower()], dtype=np.float64)
+
+
+def analyse_triangles(triangles, rotation, phi_min, ignore_grounded, ground_tolerance, angle_tolerance):
+    """
+    Overhang analysis of rotated triangles, with the ground at their lowest point. Runs on the worker pool.
+    """
+    triangles = triangles @ rotation.T
+    result = calculate_overhangs(triangles, phi_min=phi_min, ignore_grounded=ignore_grounded,
+                                 ground_level=triangles[:, :, 2].min(), ground_tolerance=ground_tolerance,
+                                 angle_tolerance=angle_tolerance)
+    return result.to_dict()
+
+
+def export_triangles(triangles, rotation, path, colored, phi_min, ignore_grounded):
+    """
+    Write rotated triangles to a binary STL file, with red problem faces if colored is set. Runs on the worker pool.
+    :return: Number of written faces
+    """
+    triangles = triangles @ rotation.T
+    attributes = None
+    if colored:
+        problem = calculate_overhangs(triangles, phi_min=phi_min, ignore_grounded=ignore_grounded,
+                                      ground_level=triangles[:, :, 2].min()).problem
+        attributes = encode_colors(np.where(problem[:, None], PROBLEM_COLOR, OK_COLOR))
+    records = triangles_to_records(triangles, attributes)
+    with open(path, 'wb') as f:
+        f.write(b'binary GeoAlt'.ljust(80, b' '))
+        f.write(len(records).to_bytes(4, byteorder='little', signed=False))
+        f.write(records.tobytes())
+    return len(records)
+
+
+class AnalysisService:
+    """
+    Long running analysis service. Requests and responses are JSON objects, one per line, over a Unix socket that
+    only the user can access, or a localhost TCP socket. Every request has an "op" and optionally an "id", which is
+    returned in the response:
+
+        {"id": 1, "op": "load", "filename": "part.stl"}
+        {"id": 1, "ok": true, "result": {"mesh_id": "...", "faces": 6860, ...}}
+
+    Operations are load, rotate, analyse, export and shutdown. Loaded models stay in memory, so that later requests
+    skip the interpreter start, the imports and the parsing. Loading and analysis run on a worker pool, of processes
+    by default, since the loaders hold the GIL. The triangles of a model are sent to a worker process with every
+    request, so a thread pool can be faster for small models.
+
+    Files are only read and written inside the root directory. A connection is closed on the first line that is not
+    a JSON object, so that e.g. an HTTP request sent to the TCP port by a web page can not run operations.
+    """
+
+    def __init__(self, max_cache_bytes=1 << 30, workers=4, root=None, executor='process'):
+        """
+        :param root: Directory that load and export paths are restricted to. Defaults to the working directory.
+        Relative paths are relative to the root.
+        :param executor: 'process' or 'thread', the type of the worker pool.
+        """
+        self.root = os.path.realpath(os.getcwd() if root is None else root)
+        self.cache = MeshCache(max_cache_bytes)
+        if executor == 'process':
+            # Spawned workers, since forking the threads of a running event loop is not safe
+            self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        elif executor == 'thread':
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        else:
+            raise TypeError('Value of executor needs to be the string value of process or thread.')
+        self.server = None
+        self.address = None  # Socket path, or (host, port)
+        self.stopped = None
+        self.connections = set()  # Stream writers of open connections
+
+    async def start(self, path=None, host='127.0.0.1', port=None):
+        """
+        Start listening on a localhost TCP port if port is given, otherwise on a Unix socket with 0600 permissions.
+        Port 0 selects a free port, see the address attribute.
+        :param path: Path of the Unix socket. Defaults to get_default_socket_path().
+        """
+        self.stopped = asyncio.Event()
+        if port is None:
+            path = get_default_socket_path() if path is None else path
+            if os.path.exists(path):
+                os.remove(path)
+            # The socket is created with owner only permissions, so that no other user can connect in between
+            umask = os.umask(0o177)
+            try:
+                self.server = await asyncio.start_unix_server(self.handle_connection, path=path)
+            finally:
+                os.umask(umask)
+            self.address = path
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, host=host, port=port)
+            self.address = self.server.sockets[0].getsockname()[:2]
+
+    async def serve(self, path=None, host='127.0.0.1', port=None, ready=None):
+        """
+        Serve until a shutdown request is received. See start() for the address.
+        :param ready: Called with the service once it is listening.
+        """
+        await self.start(path=path, host=host, port=port)
+        if ready is not None:
+            ready(self)
+        async with self.server:
+            await self.stopped.wait()
+            # Closing the open connections ends their handlers
+            for writer in list(self.connections):
+                writer.close()
+            while self.connections:
+                await asyncio.sleep(0.01)
+        self.executor.shutdown(wait=True)
+        if port is None and os.path.exists(self.address):
+            os.remove(self.address)
+
+    async def handle_connection(self, reader, writer):
+        self.connections.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('Requests need to be JSON objects.')
+                except ValueError as e:
+                    # Not a client of this service, nothing more is read from the connection
+                    response = {'id': None, 'ok': False, 'error': f'{type(e).__name__}: {e}'}
+                    writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                    await writer.drain()
+                    break
+                response = await self.handle_request(request)
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def handle_request(self, request):
+        request_id = request.get('id')
+        try:
+            op = request.pop('op')
+            handler = getattr(self, f'op_{op}', None)
+            if handler is None:
+                raise ValueError(f'Unknown operation: {op}')
+            request.pop('id', None)
+            result = await handler(**request)
+            return {'id': request_id, 'ok': True, 'result': result}
+        except Exception as e:
+            return {'id': request_id, 'ok': False, 'error': f'{type(e).__name__}: {e}'}
+
+    def resolve_path(self, filename):
+        """
+        Absolute path of a file, which needs to be inside the root directory.
+        """
+        path = os.path.realpath(os.path.join(self.root, filename))
+        if os.path.commonpath([path, self.root]) != self.root:
+            raise PermissionError(f'{filename} is outside of the root directory of the service.')
+        return path
+
+    async def run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def op_load(self, filename):
+        """
+        Load a model file, or fetch it from the cache if the file is unchanged.
+        """
+        filename = self.resolve_path(filename)
+        mesh_id = get_mesh_id(filename)
+        cached = mesh_id in self.cache
+        if cached:
+            mesh = self.cache.get(mesh_id)
+        else:
+            triangles = await self.run(load_part_triangles, filename)
+            mesh = CachedMesh(mesh_id, filename, triangles)
+            self.cache.put(mesh)
+        return dict(mesh.describe(), cached=cached)
+
+    async def op_rotate(self, mesh_id, rotation=None, theta=None, axis=None, reset=False):
+        """
+        Rotate a cached model by a 3x3 matrix, or by theta around an axis. Rotations are combined with the current
+        rotation, unless reset is set.
+        """
+        mesh = self.cache.get(mesh_id)
+        if rotation is not None:
+            matrix = np.asarray(rotation, dtype=np.float64).reshape(3, 3)
+        elif theta is not None and axis is not None:
+            matrix = rotation_matrix(theta, axis)
+        else:
+            matrix = np.eye(3)
+        mesh.rotation = matrix if reset else matrix @ mesh.rotation
+        return mesh.describe()
+
+    async def op_analyse(self, mesh_id, phi_min=np.pi / 4, ignore_grounded=False, ground_tolerance=0.01,
+                         angle_tolerance=0.017):
+        """
+        Overhang analysis of a cached model in its current rotation, with the ground at its lowest point.
+        """
+        mesh = self.cache.get(mesh_id)
+        result = await self.run(analyse_triangles, mesh.triangles, mesh.rotation, phi_min, ignore_grounded,
+                                ground_tolerance, angle_tolerance)
+        return dict(result, mesh_id=mesh_id)
+
+    async def op_export(self, mesh_id, filename, colored=False, phi_min=np.pi / 4, ignore_grounded=False):
+        """
+        Write a cached model in its current rotation to a binary STL file. Problem faces are colored red if
+        colored is set.
+        """
+        mesh = self.cache.get(mesh_id)
+        path = self.resolve_path(filename)
+        faces = await self.run(export_triangles, mesh.triangles, mesh.rotation, path, colored, phi_min,
+                               ignore_grounded)
+        return {'mesh_id': mesh_id, 'filename': filename, 'faces': faces}
+
+    async def op_shutdown(self):
+        self.stopped.set()
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local am_stl analysis service.')
+    parser.add_argument('--socket', help='Path of the Unix socket to listen on. Defaults to a per user socket in '
+                                         'the temporary directory.')
+    parser.add_argument('--port', type=int, help='Listen on this localhost TCP port instead of a Unix socket.')
+    parser.add_argument('--root', default='.', help='Directory that model files are loaded from and exported to.')
+    parser.add_argument('--cache-mb', type=int, default=1024, help='Memory bound of the model cache.')
+    parser.add_argument('--workers', type=int, default=4, help='Number of workers.')
+    parser.add_argument('--executor', choices=('process', 'thread'), default='process',
+                        help='Run the workers as processes, or as threads of the service.')
+    args = parser.parse_args()
+
+    service = AnalysisService(max_cache_bytes=args.cache_mb << 20, workers=args.workers, root=args.root,
+                              executor=args.executor)
+    asyncio.run(service.serve(path=args.socket, port=args.port,
+                              ready=lambda s: print(f'Listening on {s.address}', flush=True)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+from os.path import getsize, splitext
+
+import numpy as np
+
+from am_stl.stl.obj_parser import OBJfile
+from am_stl.stl.ply_parser import PLYfile
+from am_stl.stl.stl_parser import BINARY_FACET_DTYPE, STLfile, read_binary_facets
+from am_stl.stl.threemf_parser import ThreeMFfile
+
+FILE_TYPES = {
+    '.stl': STLfile,
+    '.obj': OBJfile,
+    '.ply': PLYfile,
+    '.3mf': ThreeMFfile
+}
+
+
+def open_mesh_file(filename, precision='float64') -> STLfile:
+    """
+    Select the file class from the file extension. All classes share the STLfile interface.
+    :param filename: Path to a .stl, .obj, .ply or .3mf file
+    :param precision: Storage precision of the coordinates, 'float64' or 'float32'. See STLfile.
+    :return: STLfile, OBJfile, PLYfile or ThreeMFfile. Call load() to read the file.
+    """
+    extension = splitext(filename)[1].lower()
+    if extension not in FILE_TYPES:
+        raise TypeError(f'Unsupported file type: {extension}')
+    return FILE_TYPES[extension](filename, precision=precision)
+
+
+def load_part_triangles(part):
+    """
+    Triangles of a part given as a FaceCollection, an (n, 3, 3) array, or a mesh file name.
+    Binary STL files are read as plain arrays, without building any Face or Vertex objects.
+    :return: Array of shape (n, 3, 3)
+    """
+    if isinstance(part, str):
+        if splitext(part)[1].lower() == '.stl':
+            with open(part, 'rb') as f:
+                f.seek(80)
+                face_count = int.from_bytes(f.read(4), byteorder='little', signed=False)
+            if getsize(part) == 84 + BINARY_FACET_DTYPE.itemsize * face_count:
+                return read_binary_facets(part)[1]['vertices'].astype(np.float64)
+        return open_mesh_file(part).load(strict_vertex_policy=False, ignore_edges=True).get_triangles()
+    if hasattr(part, 'get_triangles'):
+        return part.get_triangles()
+    return np.asarray(part, dtype=np.float64).reshape(-1, 3, 3)
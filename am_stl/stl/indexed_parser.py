@@ -0,0 +1,47 @@
+from timeit import default_timer as timer
+
+from am_stl.geometry.faces import FaceCollection
+from am_stl.stl.stl_parser import STLfile
+
+
+class IndexedMeshFile(STLfile):
+    """
+    Base class of indexed mesh files, where faces share vertices and no welding is needed. Subclasses read the file
+    in read_arrays(), and the model is built through STLfile.load_arrays().
+    """
+
+    file_header = ""  # Stored in STLfile.header
+
+    def read_arrays(self):
+        """
+        Read the vertices and faces of the file.
+        :return: Array of vertices (n, 3), array of face indices (m, 3)
+        """
+        raise NotImplementedError
+
+    def load(self, print_time_info=False, strict_vertex_policy=True, ignore_edges=False, repair_winding=False) \
+            -> FaceCollection:
+        """
+        Load the file. The model is available through the same attributes as an STLfile.
+        :param print_time_info: Set to False by default. Print time info, for debugging.
+        :param strict_vertex_policy: Not used, since the vertices of indexed files are already unique.
+        :param ignore_edges: Set to False by default. Does not store edges, only vertices and faces.
+        :param repair_winding: Set to False by default. Flip faces with inconsistent winding.
+        The report is stored in winding_report.
+        :return: FaceCollection
+        """
+        t_start = timer()
+        vertices, faces = self.read_arrays()
+        t_read = timer()
+        self.header = self.file_header
+        facecol = self.load_arrays(vertices, faces, ignore_edges=ignore_edges)
+        if repair_winding:
+            self.winding_report = facecol.fix_winding()
+
+        t_end = timer()
+        if print_time_info:
+            print(f'Total time: {t_end - t_start}')
+            print(f'Time to read: {t_read - t_start}')
+            print(f'Time to build faces: {t_end - t_read}')
+
+        return facecol
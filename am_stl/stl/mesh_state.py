@@ -0,0 +1,198 @@
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from am_stl.geometry.faces import FaceCollection
+
+# Per face values restored on every Face, with NaN where the value was None
+FACE_VALUES = ('angle', 'affected_area', 'affected_area_projected', 'support_volume', 'thickness')
+
+# Analysis results stored as face masks
+FACE_MASKS = ('problem_faces', 'good_faces', 'thin_faces')
+
+# Analysis totals of the FaceCollection
+TOTALS = ('affected_area', 'affected_area_projected', 'support_volume', 'thin_area')
+
+ALIGNMENT = 64  # Byte alignment of arrays in shared memory
+
+
+class MeshState:
+    """
+    Compact state of a loaded model, made of flat arrays and a few scalars. Pickling it is cheap and free of the
+    circular references between Face, Vertex and Edge objects. With pickle protocol 5 the arrays are passed as out
+    of band buffers:
+
+        buffers = []
+        data = pickle.dumps(state, protocol=5, buffer_callback=buffers.append)
+        state = pickle.loads(data, buffers=buffers)
+    """
+
+    def __init__(self, arrays, metadata):
+        self.arrays = arrays  # Dict of name to contiguous numpy array
+        self.metadata = metadata  # Dict of scalars: file info, ground level, analysis totals
+
+    @classmethod
+    def from_face_collection(cls, face_collection):
+        """
+        Capture the geometry and the analysis results of a FaceCollection.
+        """
+        stlfile = face_collection.stlfile
+        faces = face_collection.faces
+        position = {id(f): i for i, f in enumerate(faces)}
+
+        # Coordinates and normals are kept in the storage precision of the model
+        normals = np.asarray(stlfile.normals).reshape(-1, 3)
+        arrays = {
+            'vertices': np.ascontiguousarray(stlfile.vertices).reshape(-1, 3),
+            'faces': np.ascontiguousarray(face_collection.get_face_indices()),
+            'normals': np.ascontiguousarray(normals[[f.normal_index for f in faces]]).reshape(-1, 3),
+            'attributes': np.ascontiguousarray(stlfile.attributes, dtype=np.uint16),
+            'grounded': np.array([f.grounded for f in faces], dtype=bool)
+        }
+        for name in FACE_VALUES:
+            arrays[name] = np.array([np.nan if getattr(f, name) is None else getattr(f, name) for f in faces],
+                                    dtype=np.float64)
+        for name in FACE_MASKS:
+            mask = np.zeros(len(faces), dtype=bool)
+            mask[[position[id(f)] for f in getattr(face_collection, name)]] = True
+            arrays[name] = mask
+
+        metadata = {
+            'file_class': type(stlfile),
+            'filename': stlfile.filename,
+            'precision': stlfile.dtype.name,
+            'header': stlfile.header,
+            'color_format': stlfile.color_format,
+            'ground_level': float(stlfile.ground_level),
+            'has_edges': len(face_collection.edge_collection) > 0
+        }
+        for name in TOTALS:
+            metadata[name] = float(getattr(face_collection, name))
+        return cls(arrays, metadata)
+
+    def to_face_collection(self) -> FaceCollection:
+        """
+        Rebuild a usable FaceCollection, with its STLfile, from the state.
+        """
+        arrays = self.arrays
+        metadata = self.metadata
+        stlfile = metadata['file_class'](metadata['filename'], precision=metadata['precision'])
+        face_collection = stlfile.load_arrays(arrays['vertices'], arrays['faces'], normals=arrays['normals'],
+                                              ignore_edges=not metadata['has_edges'])
+        stlfile.header = metadata['header']
+        stlfile.color_format = metadata['color_format']
+        stlfile.ground_level = metadata['ground_level']
+        if len(arrays['attributes']) == len(arrays['faces']):
+            stlfile.attributes = np.array(arrays['attributes'], dtype=np.uint16)
+
+        values = {name: arrays[name].tolist() for name in FACE_VALUES}
+        grounded = arrays['grounded'].tolist()
+        for i, f in enumerate(face_collection.faces):
+            f.grounded = grounded[i]
+            for name in FACE_VALUES:
+                value = values[name][i]
+                setattr(f, name, None if value != value else value)  # NaN marks None
+
+        for name in FACE_MASKS:
+            setattr(face_collection, name, [face_collection.faces[i] for i in np.flatnonzero(arrays[name])])
+        for f in face_collection.problem_faces:
+            f.has_bad_angle = True
+        for f in face_collection.good_faces:
+            f.has_bad_angle = False
+        for name in TOTALS:
+            setattr(face_collection, name, metadata[name])
+        return face_collection
+
+    def to_shared_memory(self):
+        """
+        Copy the arrays into one block of shared memory. The returned handle is small, and can be sent to other
+        processes, which attach to the block without copying it through a pipe.
+        The creating process owns the block, and needs to call handle.unlink() once all processes are done.
+        :return: SharedMeshHandle
+        """
+        layout = []
+        offset = 0
+        for name, array in self.arrays.items():
+            layout.append((name, array.dtype.str, array.shape, offset))
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+
+        block = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        _created_blocks.add(block.name)
+        for name, dtype, shape, start in layout:
+            np.ndarray(shape, dtype=dtype, buffer=block.buf, offset=start)[...] = self.arrays[name]
+        handle = SharedMeshHandle(block.name, layout, self.metadata)
+        handle.block = block
+        return handle
+
+
+_created_blocks = set()  # Names of the shared memory blocks created by this process
+
+
+def attach_shared_memory(name):
+    """
+    Open an existing shared memory block, without taking ownership of it.
+    Before Python 3.13, attaching registers the block with the resource tracker, which would unlink it when this
+    process exits, and warn about a leak. Blocks created by this process stay registered until unlink().
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=name not in _created_blocks)
+    block = shared_memory.SharedMemory(name=name)
+    if name not in _created_blocks:
+        resource_tracker.unregister(block._name, 'shared_memory')
+    return block
+
+
+class SharedMeshHandle:
+    """
+    Reference to a MeshState in shared memory. Only the name, the array layout and the metadata are pickled.
+    """
+
+    def __init__(self, name, layout, metadata):
+        self.name = name  # Name of the shared memory block
+        self.layout = layout  # List of (array name, dtype, shape, byte offset)
+        self.metadata = metadata
+        self.block = None  # SharedMemory, opened on first use
+
+    def __getstate__(self):
+        return {'name': self.name, 'layout': self.layout, 'metadata': self.metadata, 'block': None}
+
+    def attach(self, copy=True) -> MeshState:
+        """
+        Read the MeshState from shared memory.
+        :param copy: Copy the arrays out of the block. If False, the arrays are views into the block, which is valid
+        until close() is called.
+        :return: MeshState
+        """
+        if self.block is None:
+            self.block = attach_shared_memory(self.name)
+        arrays = {}
+        for name, dtype, shape, offset in self.layout:
+            array = np.ndarray(shape, dtype=dtype, buffer=self.block.buf, offset=offset)
+            arrays[name] = array.copy() if copy else array
+        return MeshState(arrays, dict(self.metadata))
+
+    def to_face_collection(self) -> FaceCollection:
+        """
+        Rebuild a FaceCollection directly from shared memory.
+        """
+        return self.attach(copy=False).to_face_collection()
+
+    def close(self):
+        """
+        Detach this process from the block.
+        """
+        if self.block is not None:
+            self.block.close()
+            self.block = None
+
+    def unlink(self):
+        """
+        Free the block. Called once, by the process that created it.
+        """
+        if self.block is None:
+            self.block = shared_memory.SharedMemory(name=self.name)
+        self.block.close()
+        self.block.unlink()
+        _created_blocks.discard(self.name)
+        self.block = None
@@ -0,0 +1,50 @@
+import numpy as np
+
+from am_stl.stl.indexed_parser import IndexedMeshFile
+from am_stl.stl.ply_parser import triangulate_polygons
+
+
+def read_obj(filename):
+    """
+    Read the vertices and faces of a Wavefront OBJ file. Texture coordinates, normals, groups and materials are
+    ignored. Polygons with more than three corners are triangulated as fans.
+    :param filename: Path to the OBJ file
+    :return: Array of vertices (n, 3), array of face indices (m, 3)
+    """
+    vertex_values = []
+    face_lines = []
+    vertex_counts = []  # Number of vertices defined before each face, for resolving negative indices
+    with open(filename, 'r') as f:
+        for line in f:
+            if line.startswith('v '):
+                vertex_values.extend(line.split()[1:4])
+            elif line.startswith('f '):
+                face_lines.append(line.split()[1:])
+                vertex_counts.append(len(vertex_values) // 3)
+
+    vertices = np.array(vertex_values, dtype=np.float64).reshape(-1, 3)
+
+    if all(len(corners) == 3 for corners in face_lines):
+        # Only triangles, convert all faces at once
+        corners = [corner.split('/', 1)[0] for face in face_lines for corner in face]
+        faces = np.array(corners, dtype=np.int64).reshape(-1, 3)
+        counts = np.array(vertex_counts, dtype=np.int64)[:, None]
+        # OBJ indices start at 1, and negative indices are relative to the vertices defined so far
+        return vertices, np.where(faces < 0, faces + counts, faces - 1)
+
+    polygons = []
+    for face, count in zip(face_lines, vertex_counts):
+        indices = [int(corner.split('/', 1)[0]) for corner in face]
+        polygons.append([i + count if i < 0 else i - 1 for i in indices])
+    return vertices, triangulate_polygons(polygons)
+
+
+class OBJfile(IndexedMeshFile):
+    """
+    Wavefront OBJ file. The file is indexed, meaning that faces share vertices and no welding is needed.
+    """
+
+    file_header = "OBJ"
+
+    def read_arrays(self):
+        return read_obj(self.filename)
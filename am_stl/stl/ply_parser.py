@@ -0,0 +1,170 @@
+import numpy as np
+
+from am_stl.stl.indexed_parser import IndexedMeshFile
+
+PLY_TYPES = {
+    'char': 'i1', 'int8': 'i1',
+    'uchar': 'u1', 'uint8': 'u1',
+    'short': 'i2', 'int16': 'i2',
+    'ushort': 'u2', 'uint16': 'u2',
+    'int': 'i4', 'int32': 'i4',
+    'uint': 'u4', 'uint32': 'u4',
+    'float': 'f4', 'float32': 'f4',
+    'double': 'f8', 'float64': 'f8'
+}
+
+
+def read_ply(filename):
+    """
+    Read the vertices and faces of a PLY file. Binary files are read in bulk using numpy.
+    Polygons with more than three corners are triangulated as fans.
+    :param filename: Path to the PLY file
+    :return: Array of vertices (n, 3), array of face indices (m, 3)
+    """
+    with open(filename, 'rb') as f:
+        if f.readline().strip() != b'ply':
+            raise TypeError('File is not a PLY file.')
+
+        file_format = None
+        elements = []  # List of [name, count, properties]
+        while True:
+            line = f.readline()
+            if not line:
+                raise TypeError('Unexpected end of PLY header.')
+            words = line.decode('ascii').split()
+            if not words or words[0] in ('comment', 'obj_info'):
+                continue
+            if words[0] == 'end_header':
+                break
+            if words[0] == 'format':
+                file_format = words[1]
+            elif words[0] == 'element':
+                elements.append([words[1], int(words[2]), []])
+            elif words[0] == 'property':
+                if words[1] == 'list':
+                    elements[-1][2].append((words[4], PLY_TYPES[words[2]], PLY_TYPES[words[3]]))
+                else:
+                    elements[-1][2].append((words[2], PLY_TYPES[words[1]], None))
+
+        for name, _, properties in elements:
+            if name == 'vertex' and any(list_type is not None for _, _, list_type in properties):
+                raise TypeError('PLY vertex elements with list properties are not supported.')
+
+        if file_format == 'ascii':
+            vertices, faces = _read_ply_ascii(f, elements)
+        elif file_format == 'binary_little_endian':
+            vertices, faces = _read_ply_binary(f.read(), elements, '<')
+        elif file_format == 'binary_big_endian':
+            vertices, faces = _read_ply_binary(f.read(), elements, '>')
+        else:
+            raise TypeError(f'Unknown PLY format: {file_format}')
+
+    if vertices is None:
+        raise TypeError('PLY file has no vertex element.')
+    if faces is None:
+        raise TypeError('PLY file has no face element, e.g. it is a point cloud.')
+    return vertices, faces
+
+
+def _read_ply_binary(data, elements, endian):
+    vertices = None
+    faces = None
+    offset = 0
+
+    for name, count, properties in elements:
+        if all(list_type is None for _, _, list_type in properties):
+            # Fixed size records, read the whole element at once
+            dtype = np.dtype([(p, endian + t) for p, t, _ in properties])
+            records = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += dtype.itemsize * count
+            if name == 'vertex':
+                vertices = np.stack([records['x'], records['y'], records['z']], axis=1).astype(np.float64)
+            continue
+
+        # Elements with lists. Assume that all lists have three values, e.g. that all faces are triangles, and verify
+        # it for every list. Fall back to reading record by record if the assumption does not hold.
+        triangle_dtype = []
+        for p, t, list_type in properties:
+            if list_type is None:
+                triangle_dtype.append((p, endian + t))
+            else:
+                triangle_dtype.append((p + '_count', endian + t))
+                triangle_dtype.append((p, endian + list_type, 3))
+        triangle_dtype = np.dtype(triangle_dtype)
+        list_name = next(p for p, _, list_type in properties if list_type is not None)
+
+        records = None
+        if offset + triangle_dtype.itemsize * count <= len(data):
+            records = np.frombuffer(data, dtype=triangle_dtype, count=count, offset=offset)
+            if any(np.any(records[p + '_count'] != 3) for p, _, list_type in properties if list_type is not None):
+                records = None
+
+        if records is not None:
+            offset += triangle_dtype.itemsize * count
+            element_faces = records[list_name].astype(np.int64)
+        else:
+            element_faces, offset = _read_ply_binary_lists(data, offset, count, properties, list_name, endian)
+
+        if name == 'face':
+            faces = element_faces
+
+    return vertices, faces
+
+
+def _read_ply_binary_lists(data, offset, count, properties, list_name, endian):
+    """
+    Read element records with variable length lists, one by one.
+    """
+    polygons = []
+    for _ in range(count):
+        for p, t, list_type in properties:
+            if list_type is None:
+                offset += np.dtype(t).itemsize
+                continue
+            length = int(np.frombuffer(data, dtype=endian + t, count=1, offset=offset)[0])
+            offset += np.dtype(t).itemsize
+            values = np.frombuffer(data, dtype=endian + list_type, count=length, offset=offset)
+            offset += np.dtype(list_type).itemsize * length
+            if p == list_name:
+                polygons.append(values)
+    return triangulate_polygons(polygons), offset
+
+
+def _read_ply_ascii(f, elements):
+    vertices = None
+    faces = None
+
+    for name, count, properties in elements:
+        lines = [f.readline().split() for _ in range(count)]
+        if name == 'vertex':
+            names = [p for p, _, _ in properties]
+            columns = [names.index('x'), names.index('y'), names.index('z')]
+            vertices = np.array([[float(line[i]) for i in columns] for line in lines], dtype=np.float64)
+        elif name == 'face':
+            # The vertex index list is assumed to be the first property
+            polygons = [[int(v) for v in line[1:int(line[0]) + 1]] for line in lines]
+            faces = triangulate_polygons(polygons)
+
+    return vertices, faces
+
+
+def triangulate_polygons(polygons):
+    """
+    Triangulate a list of convex polygons (lists of vertex indices) as triangle fans.
+    """
+    triangles = []
+    for polygon in polygons:
+        for i in range(1, len(polygon) - 1):
+            triangles.append([polygon[0], polygon[i], polygon[i + 1]])
+    return np.array(triangles, dtype=np.int64).reshape(-1, 3)
+
+
+class PLYfile(IndexedMeshFile):
+    """
+    PLY file. The file is indexed, meaning that faces share vertices and no welding is needed.
+    """
+
+    file_header = "PLY"
+
+    def read_arrays(self):
+        return read_ply(self.filename)
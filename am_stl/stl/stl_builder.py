@@ -1,7 +1,13 @@
+import numpy as np
+
 from am_stl.geometry.faces import FaceCollection
+from am_stl.stl.file_types import load_part_triangles
+from am_stl.stl.stl_colors import encode_colors
+from am_stl.stl.stl_parser import BINARY_FACET_DTYPE
 from os.path import exists
 from os import remove
 
+
 class STLCreator:
     """
     Class for creating STL files out of a FaceCollection
@@ -34,6 +40,51 @@ class STLCreator:
         self.__parse_face_collection__()
         self.__close_file__()
 
+    def build_binary_file(self, attributes=None, color_format=None):
+        """
+        Build a binary STL file. All facets are packed into one buffer in a single vectorized operation.
+        :param attributes: The 2-byte attribute word of every face, e.g. from encode_colors().
+        Defaults to the attribute words of the loaded file, if there are any.
+        :param color_format: Set to 'magics' to write the COLOR header that Materialise Magics expects.
+        """
+        if self.stream is not None:
+            raise IOError("File stream was already opened")
+
+        # Coordinates are taken in their storage precision, as a float32 model is already exact in the records
+        stlfile = self.face_collection.stlfile
+        records = triangles_to_records(stlfile.vertices[self.face_collection.get_face_indices()])
+
+        if attributes is None:
+            attributes = self.face_collection.stlfile.attributes
+            if color_format is None:
+                color_format = self.face_collection.stlfile.color_format
+        if len(attributes) == len(records):
+            records['attribute'] = attributes
+        elif len(attributes) > 0:
+            raise ValueError('There needs to be one attribute word per face.')
+
+        if color_format == 'magics':
+            header = b'COLOR=' + bytes([255, 255, 255, 255]) + b' GeoAlt'
+        else:
+            header = b'binary GeoAlt'
+
+        if exists(self.file_destination) and self.overwrite is True:
+            remove(self.file_destination)
+
+        with open(self.file_destination, 'xb') as f:
+            f.write(header.ljust(80, b' '))
+            f.write(len(records).to_bytes(4, byteorder='little', signed=False))
+            f.write(records.tobytes())
+
+    def build_colored_file(self, colors, color_format='viscam'):
+        """
+        Build a binary STL file where every face is colored, e.g. by analysis results.
+        See stl_colors.classification_colors() and stl_colors.angle_heat_map().
+        :param colors: Array of shape (n, 3) with RGB values between 0 and 1, one row per face.
+        :param color_format: 'viscam' (VisCAM, SolidView and most slicers) or 'magics' (Materialise Magics).
+        """
+        self.build_binary_file(attributes=encode_colors(colors, color_format), color_format=color_format)
+
     def __create_file__(self):
         if exists(self.file_destination) and self.overwrite is True:
             remove(self.file_destination)
@@ -69,3 +120,53 @@ class STLCreator:
                 "\t\t\tvertex %f %f %f\n" % (face.vertices[2].x(), face.vertices[2].y(), face.vertices[2].z()))
             self.stream.write("\t\tendloop\n")
             self.stream.write("\tendfacet\n")
+
+
+def triangles_to_records(triangles, attributes=None):
+    """
+    Pack triangles into binary STL facet records. Normals are calculated from the winding.
+    :param triangles: Array of shape (n, 3, 3)
+    :param attributes: The 2-byte attribute word of every face, or None
+    :return: Array of facet records with the BINARY_FACET_DTYPE layout
+    """
+    triangles = np.asarray(triangles, dtype=np.float64).reshape(-1, 3, 3)
+    records = np.zeros(len(triangles), dtype=BINARY_FACET_DTYPE)
+    n = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    length = np.linalg.norm(n, axis=1)
+    records['normal'] = n / np.where(length > 0, length, 1)[:, None]
+    records['vertices'] = triangles
+    if attributes is not None:
+        records['attribute'] = attributes
+    return records
+
+
+def build_plate_file(file_destination, parts, translations, overwrite=True):
+    """
+    Write all parts of a build plate into one binary STL file. Parts are loaded, translated and written one at a
+    time, so that the whole plate is never held in memory. The face count is written once all parts are done.
+    :param file_destination: Path of the STL file
+    :param parts: List of FaceCollection, (n, 3, 3) triangle arrays or mesh file names, see nest_parts().
+    :param translations: Translation of every part, e.g. NestingResult.get_translations(). Parts with a translation
+    of None are left out.
+    :param overwrite: Overwrite the file if it exists.
+    :return: Number of faces written
+    """
+    if exists(file_destination):
+        if overwrite is False:
+            raise FileExistsError('File already exists, and overwrite is set to False.')
+        remove(file_destination)
+
+    face_count = 0
+    with open(file_destination, 'xb') as f:
+        f.write(b'binary GeoAlt plate'.ljust(80, b' '))
+        f.write(bytes(4))  # Face count, patched at the end
+        for part, translation in zip(parts, translations):
+            if translation is None:
+                continue
+            records = triangles_to_records(load_part_triangles(part) + np.asarray(translation, dtype=np.float64))
+            f.write(records.tobytes())
+            face_count += len(records)
+
+        f.seek(80)
+        f.write(face_count.to_bytes(4, byteorder='little', signed=False))
+    return face_count
@@ -0,0 +1,68 @@
+import numpy as np
+
+# Per-face colours used when exporting analysis results
+PROBLEM_COLOR = (1.0, 0.0, 0.0)
+GROUNDED_COLOR = (0.0, 0.0, 1.0)
+OK_COLOR = (0.75, 0.75, 0.75)
+
+
+def encode_colors(colors, color_format='viscam'):
+    """
+    Encode RGB colours into 15-bit binary STL attribute words.
+    VisCAM/SolidView: blue in bits 0-4, green in bits 5-9, red in bits 10-14, bit 15 set if the colour is valid.
+    Materialise Magics: red in bits 0-4, green in bits 5-9, blue in bits 10-14, bit 15 cleared if the colour is
+    valid.
+    :param colors: Array of shape (n, 3) with RGB values between 0 and 1.
+    :param color_format: 'viscam' or 'magics'
+    :return: Array of uint16 attribute words
+    """
+    rgb = np.round(np.clip(np.asarray(colors, dtype=np.float64).reshape(-1, 3), 0, 1) * 31).astype(np.uint16)
+    if color_format == 'viscam':
+        return (1 << 15) | (rgb[:, 0] << 10) | (rgb[:, 1] << 5) | rgb[:, 2]
+    elif color_format == 'magics':
+        return (rgb[:, 2] << 10) | (rgb[:, 1] << 5) | rgb[:, 0]
+    raise TypeError('Value of color_format needs to be the string value of viscam or magics.')
+
+
+def decode_colors(attributes, color_format='viscam'):
+    """
+    Decode binary STL attribute words into RGB colours.
+    :param attributes: Array of uint16 attribute words
+    :param color_format: 'viscam' or 'magics'
+    :return: Array of shape (n, 3) with RGB values between 0 and 1, and a boolean array that is True for faces
+    with a valid colour.
+    """
+    attributes = np.asarray(attributes, dtype=np.uint16)
+    channels = np.stack([(attributes >> 10) & 31, (attributes >> 5) & 31, attributes & 31], axis=1) / 31
+    if color_format == 'viscam':
+        return channels, (attributes >> 15) == 1
+    elif color_format == 'magics':
+        return channels[:, ::-1], (attributes >> 15) == 0
+    raise TypeError('Value of color_format needs to be the string value of viscam or magics.')
+
+
+def classification_colors(face_collection):
+    """
+    Colour every face by the result of FaceCollection.check_for_problems: problem, grounded or OK.
+    """
+    problem = np.array([f.has_bad_angle is True for f in face_collection.faces], dtype=bool)
+    grounded = np.array([f.grounded is True for f in face_collection.faces], dtype=bool)
+
+    colors = np.tile(OK_COLOR, (len(face_collection.faces), 1))
+    colors[grounded] = GROUNDED_COLOR
+    colors[problem] = PROBLEM_COLOR
+    return colors
+
+
+def angle_heat_map(angles, phi_min=np.pi / 4):
+    """
+    Colour faces by their overhang angle (angle between the normal vector and -Z). Faces pointing straight down
+    are red, faces at phi_min are yellow, and faces at or above twice phi_min are green.
+    :param angles: Array of face angles, in rads. See Face.angle.
+    :param phi_min: Tolerated angle
+    :return: Array of shape (n, 3) with RGB values between 0 and 1
+    """
+    t = np.clip(np.nan_to_num(np.asarray(angles, dtype=np.float64), nan=np.pi) / (2 * phi_min), 0, 1)
+    red = np.clip(2 - 2 * t, 0, 1)
+    green = np.clip(2 * t, 0, 1)
+    return np.stack([red, green, np.zeros_like(t)], axis=1)
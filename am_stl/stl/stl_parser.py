@@ -1,19 +1,65 @@
 import re
+import warnings
 from timeit import default_timer as timer
 import numpy as np
-from struct import unpack
 
+from am_stl.exceptions import STL_PRECISION_EXCEPTION
 from am_stl.geometry.faces import Face, FaceCollection
 from am_stl.geometry.vertices import Vertex, VertexCollection
+from am_stl.stl.stl_colors import decode_colors
+
+# Layout of a facet record in a binary STL file
+BINARY_FACET_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vertices', '<f4', (3, 3)),
+    ('attribute', '<u2')
+])
+
+# Storage precisions of vertex coordinates and normals
+PRECISIONS = ('float32', 'float64')
+
+# A tolerance needs to be this many times larger than the rounding error of the stored coordinates
+PRECISION_MARGIN = 4
+
+# Attribute words are VisCAM colours if at least this fraction of the facets has the valid bit set. Other exporters
+# leave arbitrary values in the attribute words, which would otherwise be read as colours.
+VISCAM_MIN_FRACTION = 0.9
+
+
+def read_binary_facets(filename):
+    """
+    Read all facet records of a binary STL file in one go, without creating any objects.
+    :param filename: Path to a binary STL file
+    :return: 80 byte header, array of facet records with the BINARY_FACET_DTYPE layout
+    """
+    with open(filename, 'rb') as f:
+        header = f.read(80)
+        face_count = int.from_bytes(f.read(4), byteorder='little', signed=False)
+        records = np.fromfile(f, dtype=BINARY_FACET_DTYPE, count=face_count)
+    return header, records
 
 
 class STLfile:
-    def __init__(self, filename):
+    def __init__(self, filename, precision='float64'):
+        """
+        :param filename: Path to the file
+        :param precision: 'float64' or 'float32'. Storage precision of the vertex coordinates and normals.
+        float32 halves the memory of the model, and is lossless for binary STL files until the model is transformed.
+        Calculations are always done in float64, see check_tolerances() for the resulting error.
+        """
+        if np.dtype(precision).name not in PRECISIONS:
+            raise TypeError('Precision needs to be float32 or float64.')
         self.filename = filename
         self.header = ""
-        self.vertices = []
-        self.normals = []
+        self.dtype = np.dtype(precision)
+        self.vertices = np.zeros((0, 3), dtype=self.dtype)  # Coordinates, one contiguous row per Vertex.index
+        self.normals = np.zeros((0, 3), dtype=self.dtype)  # Stored normals, one contiguous row per Face.normal_index
+        self.attributes = np.zeros(0, dtype=np.uint16)  # The 2-byte attribute word of each facet (binary files)
+        self.color_format = None  # 'viscam' or 'magics' if the attribute words hold colours
+        self.winding_report = None  # Set when loading with repair_winding=True
         self.ground_level = 0
+        self.geometry_version = 0  # Incremented whenever vertex coordinates change, so cached data can be refreshed
+        self.shape_version = 0  # Incremented when the model changes other than by a rotation, e.g. when it is scaled
         self.grounded = False  # This variable is set by the external "Face" class.
 
         self._time_data = {
@@ -28,10 +74,6 @@ class STLfile:
         """
         Rotate the model around the X, Y or Z axis. The results are immediately stored.
         """
-        self.grounded = False  # Rotating the model could cause the model to no longer be grounded.
-
-        b = np.array(self.vertices).T
-
         if axis.lower() == "x":
             T = np.array([
                 [1, 0, 0],
@@ -49,8 +91,20 @@ class STLfile:
         else:
             raise TypeError('Value of axis needs to be the string value of x, y, or z.')
 
-        res = np.dot(T, b)
-        self.vertices = res.T.tolist()
+        self.transform(T)
+
+    def transform(self, T):
+        """
+        Apply a 3x3 transformation matrix, e.g. a rotation matrix, to the model. The results are immediately stored.
+        """
+        self.grounded = False  # Transforming the model could cause the model to no longer be grounded.
+        self.geometry_version += 1
+        T = np.asarray(T, dtype=np.float64)
+        if not np.allclose(T @ T.T, np.eye(3)):
+            self.shape_version += 1
+
+        res = self.vertices @ np.asarray(T, dtype=np.float64).T
+        self.vertices = np.ascontiguousarray(res, dtype=self.dtype)
         self.calculate_ground_level()
 
     def calculate_ground_level(self):
@@ -59,34 +113,82 @@ class STLfile:
         Notice that the ground level changes if the model is rotated, but is automatically recalculated and can be
         fetched through the stl.ground_level variable.
         """
-        verts = np.array(self.vertices)
-        self.ground_level = verts.min(axis=0)[2]
+        self.ground_level = float(self.vertices[:, 2].min())
 
         return self.ground_level
 
-    def __new_face__(self, facecol, n):
+    def get_resolution(self):
         """
-        Create and store a new face.
+        Upper bound of the rounding error of a stored coordinate, in the units of the model. It grows with the distance
+        from the origin, and is about 1e-7 times the largest distance for float32, and 2e-16 times for float64.
+        The distance does not change when the model is rotated, so neither does the resolution.
         """
-        t0 = timer()
-        normal_index = len(self.normals)
-        vertex_index = len(self.vertices)
-        self.normals.append(n)
+        if len(self.vertices) == 0:
+            return 0.0
+        return float(np.spacing(np.linalg.norm(self.vertices, axis=1).max().astype(self.dtype)))
+
+    def check_tolerances(self, proximity_tolerance=None, ground_tolerance=None, angle_tolerance=None,
+                         edge_length=None):
+        """
+        Check that tolerances can be resolved in the storage precision. A distance tolerance needs to be
+        PRECISION_MARGIN times larger than get_resolution(). The error of a face angle is about the resolution divided
+        by the edge length of the face, so an angle tolerance is checked against the typical edge length.
+        Tolerances that are None or 0 are not checked.
+        :param proximity_tolerance: Distance tolerance, e.g. Vertex.proximity_tolerance
+        :param ground_tolerance: Distance tolerance, as in check_for_problems()
+        :param angle_tolerance: Angle tolerance in rads, as in check_for_problems()
+        :param edge_length: Typical edge length of the faces. Required for checking angle_tolerance.
+        :raises STL_PRECISION_EXCEPTION: If a tolerance is too small for the storage precision.
+        """
+        resolution = PRECISION_MARGIN * self.get_resolution()
+        for name, tolerance in (('proximity_tolerance', proximity_tolerance), ('ground_tolerance', ground_tolerance)):
+            if tolerance and tolerance < resolution:
+                raise STL_PRECISION_EXCEPTION(f'{name} of {tolerance:g} is below the {resolution:g} that can be '
+                                              f'resolved with {self.dtype.name} coordinates. Use float64 precision.')
+        if angle_tolerance and edge_length:
+            if angle_tolerance < resolution / edge_length:
+                raise STL_PRECISION_EXCEPTION(f'angle_tolerance of {angle_tolerance:g} is below the '
+                                              f'{resolution / edge_length:g} rad that can be resolved with '
+                                              f'{self.dtype.name} coordinates. Use float64 precision.')
+
+    def __store_arrays__(self, vertices, normals):
+        """
+        Store copies of the vertex coordinates and normals in the storage precision. The model never shares memory
+        with the given arrays, which may be read-only, or views into shared memory or another model.
+        """
+        self.vertices = np.array(np.reshape(vertices, (-1, 3)), dtype=self.dtype, order='C', copy=True)
+        self.normals = np.array(np.reshape(normals, (-1, 3)), dtype=self.dtype, order='C', copy=True)
+        self.shape_version += 1
+        self.check_tolerances(proximity_tolerance=Vertex.proximity_tolerance)
 
+    def __new_face__(self, facecol, normal_index, vertex_index):
+        """
+        Create a new face from a stored normal.
+        """
+        t0 = timer()
         face = Face(facecol, normal_index, vertex_index)
         self._time_data['new_face'] += timer() - t0
         return face
 
-    def __new_vertex__(self, face, array):
+    def __new_vertex__(self, face, vertex_index):
         """
-        Create and store a new vertex
+        Create a new vertex from stored coordinates.
         """
         t0 = timer()
-        vertex_index = len(self.vertices)
-        self.vertices.append(array)
         face.vertices.append(Vertex(face.face_collection, vertex_index))
         self._time_data['new_vertex'] += timer() - t0
 
+    def __build_faces__(self, facecol, ignore_edges=False):
+        """
+        Create a face for every stored normal, from three consecutive stored vertices.
+        """
+        for i in range(len(self.normals)):
+            face = self.__new_face__(facecol, i, 3 * i)
+            self.__new_vertex__(face, 3 * i)
+            self.__new_vertex__(face, 3 * i + 1)
+            self.__new_vertex__(face, 3 * i + 2)
+            self.__end_facet__(face, facecol, ignore_edges=ignore_edges)
+
     def __end_facet__(self, face: Face, facecol: FaceCollection, ignore_edges: bool = False):
         """
         Create new face (facet)
@@ -100,7 +202,51 @@ class STLfile:
         self._time_data['normal_vector_refresh'] += t_normal_vector_refresh - t0
         self._time_data['append_face_to_collection'] += t_append_to_facecol - t_normal_vector_refresh
 
-    def load(self, print_time_info=False, strict_vertex_policy=True, ignore_edges=False) -> FaceCollection:
+    def load_arrays(self, vertices, face_indices, normals=None, ignore_edges=False) -> FaceCollection:
+        """
+        Build the model from an indexed mesh, e.g. a decimated mesh or a mesh from an indexed file format.
+        Faces share Vertex objects through the face indices, so no welding is needed.
+        :param vertices: Array of shape (n, 3)
+        :param face_indices: Array of shape (m, 3) with the vertex indices of every face.
+        :param normals: Array of shape (m, 3) with the stored normal of every face. Calculated if not given.
+        :param ignore_edges: Set to False by default. Does not store edges, only vertices and faces.
+        :return: FaceCollection
+        """
+        VertexCollection.enforce_strict_vertex_policy = False
+        facecol = FaceCollection(self)
+
+        vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+        face_indices = np.asarray(face_indices, dtype=np.int64).reshape(-1, 3)
+        if normals is None:
+            normals = np.cross(vertices[face_indices[:, 1]] - vertices[face_indices[:, 0]],
+                               vertices[face_indices[:, 2]] - vertices[face_indices[:, 0]])
+            length = np.linalg.norm(normals, axis=1)
+            normals = normals / np.where(length > 0, length, 1)[:, None]
+
+        self.__store_arrays__(vertices, normals)
+
+        vertex_objects = [Vertex(facecol, i) for i in range(len(vertices))]
+        for i, (i1, i2, i3) in enumerate(face_indices.tolist()):
+            face = Face(facecol, i, i1)
+            face.vertices = [vertex_objects[i1], vertex_objects[i2], vertex_objects[i3]]
+            self.__end_facet__(face, facecol, ignore_edges=ignore_edges)
+
+        self.attributes = np.zeros(len(face_indices), dtype=np.uint16)
+        self.calculate_ground_level()
+        return facecol
+
+    def get_face_colors(self):
+        """
+        Decode the facet attribute words of a colored binary STL.
+        :return: Array of shape (n, 3) with RGB values between 0 and 1, and a boolean array that is True for faces
+        with a valid colour. None if the file has no colours.
+        """
+        if self.color_format is None:
+            return None
+        return decode_colors(self.attributes, self.color_format)
+
+    def load(self, print_time_info=False, strict_vertex_policy=True, ignore_edges=False, repair_winding=False) \
+            -> FaceCollection:
         """
         This generic load method is used to load any type of .stl-file. It will compensate automatically for ASCII,
         binary or colored binary STLs. ASCII-files typically take a longer time to load than binary files.
@@ -110,10 +256,25 @@ class STLfile:
         Slows down the load time significantly.
         :param ignore_edges: Set to False by default. Does not store edges, only vertices and faces.
         Slows down the load time significantly.
+        :param repair_winding: Set to False by default. Flip faces with inconsistent winding, and correct stored
+        normals that disagree with it. The report is stored in STLfile.winding_report.
         :return:
         """
+        facecol = self.__load_any__(print_time_info=print_time_info, strict_vertex_policy=strict_vertex_policy,
+                                    ignore_edges=ignore_edges)
+        if repair_winding:
+            t0 = timer()
+            self.winding_report = facecol.fix_winding()
+            if print_time_info:
+                print(f'Time to repair winding: {timer() - t0}')
+        return facecol
+
+    def __load_any__(self, print_time_info=False, strict_vertex_policy=True, ignore_edges=False) -> FaceCollection:
+        """
+        Select the ASCII or binary loader from the start of the file.
+        """
         f = open(self.filename, 'rb')
-        type_str = f.read(5).decode('utf-8')
+        type_str = f.read(5).decode('utf-8', errors='replace')
         f.close()
 
         if "SOLID" in type_str.upper():
@@ -126,54 +287,48 @@ class STLfile:
                 return self.load_binary(print_time_info=print_time_info,
                                         strict_vertex_policy=strict_vertex_policy,
                                         ignore_edges=ignore_edges)
-        elif "COLOR" in type_str.upper():
-            print("COLOR LOAD")
-            return self.load_binary(color=True, print_time_info=print_time_info,
-                                    strict_vertex_policy=strict_vertex_policy,
-                                    ignore_edges=ignore_edges)
 
         return self.load_binary(print_time_info=print_time_info,
                                 strict_vertex_policy=strict_vertex_policy,
                                 ignore_edges=ignore_edges)
 
-    def load_binary(self, color=False, print_time_info=False, strict_vertex_policy=True, ignore_edges=False) \
+    def load_binary(self, color=None, print_time_info=False, strict_vertex_policy=True, ignore_edges=False) \
             -> FaceCollection:
         """
         Load function specifically made for binary files.
+        :param color: Deprecated, and not used. Colours are detected from the file: a header starting with COLOR=
+        marks Magics colours, and the valid bit set in the attribute words of (almost) all facets marks VisCAM colours.
         """
+        if color is not None:
+            warnings.warn('The color parameter of load_binary() is deprecated, colours are detected from the file.',
+                          DeprecationWarning, stacklevel=2)
         VertexCollection.enforce_strict_vertex_policy = strict_vertex_policy
         t_start = timer()
         facecol = FaceCollection(self)
         f = open(self.filename, 'rb')
         t_open = timer()
 
-        if color is True:
-            f.read(80)
+        header = f.read(80)
+        magics = header.startswith(b'COLOR=')
+        if magics:
             self.header = "Colored solid."
         else:
-            try:
-                self.header = f.read(80).decode('utf-8')
-            except UnicodeDecodeError:
-                f.close()
-                return self.load_binary(color=True)
+            # The header is free form, and not always valid UTF-8
+            self.header = header.decode('utf-8', errors='replace')
 
         face_count = int.from_bytes(f.read(4), byteorder='little', signed=False)
         t_header = timer()
 
-        for i in range(0, face_count):
-            n = unpack('<fff', f.read(12))
-            face = self.__new_face__(facecol, [n[0], n[1], n[2]])
+        records = np.fromfile(f, dtype=BINARY_FACET_DTYPE, count=face_count)
+        self.__store_arrays__(records['vertices'], records['normal'])
+        self.__build_faces__(facecol, ignore_edges=ignore_edges)
 
-            v1 = unpack('<fff', f.read(12))
-            self.__new_vertex__(face, [v1[0], v1[1], v1[2]])
-            v2 = unpack('<fff', f.read(12))
-            self.__new_vertex__(face, [v2[0], v2[1], v2[2]])
-            v3 = unpack('<fff', f.read(12))
-            self.__new_vertex__(face, [v3[0], v3[1], v3[2]])
-
-            self.__end_facet__(face, facecol, ignore_edges=ignore_edges)
-
-            spacer = int.from_bytes(f.read(2), byteorder='little', signed=False)
+        # The attribute words are kept, so that colours survive a round trip
+        self.attributes = records['attribute'].copy()
+        if magics:
+            self.color_format = 'magics'
+        elif len(self.attributes) > 0 and np.mean(self.attributes >> 15) >= VISCAM_MIN_FRACTION:
+            self.color_format = 'viscam'
 
         t_unpack = timer()
 
@@ -202,7 +357,8 @@ class STLfile:
         ln = 1  # File line nr
         fl = 1  # Face line nr
 
-        current_face = None
+        normals = []
+        vertices = []
         t_open = timer()
 
         for line in f:
@@ -218,8 +374,7 @@ class STLfile:
                         break
                     else:
                         search = re.search(r"facet\snormal\s+(\S+)\s+(\S+)\s+(\S+)", line)
-                        current_face = self.__new_face__(facecol, np.array(
-                            [float(search.group(1)), float(search.group(2)), float(search.group(3))]))
+                        normals.append([float(search.group(1)), float(search.group(2)), float(search.group(3))])
                 elif fl == 2 or fl == 6:
                     # Outer loop or End loop
                     pass
@@ -227,20 +382,23 @@ class STLfile:
                     # Vertex
                     vertexStr = line
                     search = re.search(r"vertex\s+(\S+)\s+(\S+)\s+(\S+)", vertexStr)
-                    self.__new_vertex__(current_face, np.array(
-                        [float(search.group(1)), float(search.group(2)), float(search.group(3))]))
+                    vertices.append([float(search.group(1)), float(search.group(2)), float(search.group(3))])
                 elif fl == 7:
                     # End facet
-                    self.__end_facet__(current_face, facecol, ignore_edges=ignore_edges)
-                    current_face = None
                     fl = 0
                 else:
                     raise TypeError("Error encountered when parsing through face. Unhandled face line number.")
                 fl += 1  # Face line += 1
             ln += 1  # File line += 1
 
-        t_unpack = timer()
         f.close()
+        # Only complete facets are kept
+        count = min(len(normals), len(vertices) // 3)
+        self.__store_arrays__(vertices[:3 * count], normals[:count])
+        self.__build_faces__(facecol, ignore_edges=ignore_edges)
+
+        t_unpack = timer()
+        self.attributes = np.zeros(len(facecol.faces), dtype=np.uint16)
         self.calculate_ground_level()
 
         t_end = timer()
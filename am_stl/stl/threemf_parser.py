@@ -0,0 +1,145 @@
+import zipfile
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from am_stl.stl.indexed_parser import IndexedMeshFile
+
+CORE_NAMESPACE = '{http://schemas.microsoft.com/3dmanufacturing/core/2015/02}'
+
+# Scale factors from 3MF units to millimeters
+UNITS = {
+    'micron': 0.001,
+    'millimeter': 1.0,
+    'centimeter': 10.0,
+    'inch': 25.4,
+    'foot': 304.8,
+    'meter': 1000.0
+}
+
+
+def read_3mf(filename):
+    """
+    Read the vertices and faces of a 3MF file. The model XML is parsed as a stream, so that the element tree of
+    large meshes is never held in memory. All build items are included, with their transforms applied, and
+    coordinates are converted to millimeters.
+    :param filename: Path to the 3MF file
+    :return: Array of vertices (n, 3), array of face indices (m, 3)
+    """
+    with zipfile.ZipFile(filename) as archive:
+        model_name = _find_model_part(archive)
+        with archive.open(model_name) as stream:
+            objects, items, scale = _parse_model(stream)
+
+    if not items:
+        # No build section, include all meshes as they are
+        items = [(object_id, np.eye(4)) for object_id in objects]
+
+    vertex_arrays = []
+    face_arrays = []
+    offset = 0
+    for object_id, transform in items:
+        for vertices, faces in _resolve_object(objects, object_id, transform):
+            vertex_arrays.append(vertices * scale)
+            face_arrays.append(faces + offset)
+            offset += len(vertices)
+
+    if not vertex_arrays:
+        return np.zeros((0, 3)), np.zeros((0, 3), dtype=np.int64)
+    return np.concatenate(vertex_arrays), np.concatenate(face_arrays)
+
+
+def _find_model_part(archive):
+    """
+    Find the root model part from the package relationships, or fall back to the default location.
+    """
+    try:
+        relationships = ET.fromstring(archive.read('_rels/.rels'))
+        for relationship in relationships:
+            if relationship.get('Type', '').endswith('/3dmodel'):
+                return relationship.get('Target').lstrip('/')
+    except KeyError:
+        pass
+    return '3D/3dmodel.model'
+
+
+def _parse_model(stream):
+    """
+    Parse the model XML. Every element is removed from its parent once it has been read, so the memory of the parser
+    does not grow with the number of vertices and triangles.
+    :return: Dict of object id to mesh arrays or component list, list of build items, unit scale.
+    """
+    objects = {}
+    items = []
+    scale = 1.0
+
+    vertex_values = []
+    triangle_values = []
+    components = []
+    parents = []  # Open elements, from the root down
+
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        tag = elem.tag.replace(CORE_NAMESPACE, '')
+        if event == 'start':
+            parents.append(elem)
+            if tag == 'model':
+                scale = UNITS[elem.get('unit', 'millimeter')]
+            elif tag == 'object':
+                vertex_values = []
+                triangle_values = []
+                components = []
+            continue
+
+        parents.pop()
+        if parents:
+            parents[-1].remove(elem)
+        if tag == 'vertex':
+            vertex_values.extend((elem.get('x'), elem.get('y'), elem.get('z')))
+        elif tag == 'triangle':
+            triangle_values.extend((elem.get('v1'), elem.get('v2'), elem.get('v3')))
+        elif tag == 'component':
+            components.append((elem.get('objectid'), _parse_transform(elem.get('transform'))))
+        elif tag == 'object':
+            if components:
+                objects[elem.get('id')] = components
+            else:
+                objects[elem.get('id')] = (np.array(vertex_values, dtype=np.float64).reshape(-1, 3),
+                                           np.array(triangle_values, dtype=np.int64).reshape(-1, 3))
+        elif tag == 'item':
+            items.append((elem.get('objectid'), _parse_transform(elem.get('transform'))))
+
+    return objects, items, scale
+
+
+def _parse_transform(value):
+    """
+    3MF transforms are 12 values, the first three rows of a 4x3 matrix in row vector convention.
+    """
+    matrix = np.eye(4)
+    if value:
+        matrix[:, :3] = np.array(value.split(), dtype=np.float64).reshape(4, 3)
+    return matrix
+
+
+def _resolve_object(objects, object_id, transform):
+    """
+    Yield the transformed mesh arrays of an object, following components recursively.
+    """
+    content = objects[object_id]
+    if isinstance(content, list):
+        for component_id, component_transform in content:
+            yield from _resolve_object(objects, component_id, component_transform @ transform)
+    else:
+        vertices, faces = content
+        yield vertices @ transform[:3, :3] + transform[3, :3], faces
+
+
+class ThreeMFfile(IndexedMeshFile):
+    """
+    3MF file. The file is indexed, meaning that faces share vertices and no welding is needed.
+    """
+
+    file_header = "3MF"
+
+    def read_arrays(self):
+        return read_3mf(self.filename)
@@ -1,5 +1,12 @@
-from am_stl.stl.stl_parser import STLfile
+from am_stl.stl.stl_parser import BINARY_FACET_DTYPE, STLfile
+from am_stl.geometry.fingerprint import AnalysisCache
+from am_stl.geometry.topology import check_topology, orient_faces
+from am_stl.geometry.overhangs import calculate_overhangs
+from am_stl.geometry.voxels import find_cavities, voxelize
+from am_stl.geometry.sampling import estimate_overhangs
+from am_stl.geometry.thickness import UniformGrid
 import numpy as np
+import pytest
 
 
 def test_ascii_problem_surface_identification():
@@ -129,5 +136,333 @@ def test_get_support_volume_04():
     assert abs(face_collection.support_volume - expected_volume) < error_tolerance
 
 
+def test_mass_properties_cube():
+    error_tolerance = 0.001
+    cube_side = 100
+    stl_file = STLfile(r"test/test_assets/bin-test-cube-0.stl")
+    face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+    props = face_collection.get_mass_properties(density=2.0)
+
+    assert abs(props.volume - cube_side ** 3) < error_tolerance
+    assert abs(props.area - 6 * cube_side ** 2) < error_tolerance
+    assert np.allclose(props.center_of_mass, [50, 50, 100])
+    # A solid cube has the moment of inertia m*a^2/6 around every axis through its centre of mass
+    assert np.allclose(props.inertia, np.eye(3) * props.mass * cube_side ** 2 / 6, atol=error_tolerance)
+
+
+def test_center_over_footprint():
+    stl_file = STLfile(r"test/test_assets/bin-test-cube-0.stl")
+    face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+    stable, margins = face_collection.check_center_over_footprint()
+    assert stable[0]
+    assert abs(margins[0] - 50) < 0.001
+
+    # Resting on an edge: the centre of mass is not over the footprint
+    theta = np.pi / 4
+    rotation = np.array([[np.cos(theta), 0, np.sin(theta)], [0, 1, 0], [-np.sin(theta), 0, np.cos(theta)]])
+    stable, margins = face_collection.check_center_over_footprint(rotations=[np.eye(3), rotation])
+    assert list(stable) == [True, False]
+
+    stl_file = STLfile(r"test/test_assets/bin-test-cube-40.stl")
+    face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+    stable, margins = face_collection.check_center_over_footprint()
+    assert not stable[0]
+
+
+def test_stable_poses_cube():
+    error_tolerance = 0.001
+    stl_file = STLfile(r"test/test_assets/bin-test-cube-40.stl")
+    face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+    poses = face_collection.get_stable_poses()
+
+    # A cube can rest on any of its six sides
+    assert len(poses) == 6
+    for pose in poses:
+        assert pose.stable
+        assert abs(pose.contact_area - 10000) < error_tolerance
+        assert abs(pose.margin - 50) < error_tolerance
+
+    # Placing the cube in a stable pose removes all overhangs except the grounded side
+    stl_file.transform(poses[0].rotation)
+    bad_faces, ok_faces = face_collection.check_for_problems(ignore_grounded=False, ground_level=stl_file.ground_level)
+    assert len(bad_faces) == 0
+    assert face_collection.check_center_over_footprint()[0][0]
+
+
+def test_fingerprint_cache():
+    theta = 0.7
+    rotation = np.array([[np.cos(theta), 0, np.sin(theta)], [0, 1, 0], [-np.sin(theta), 0, np.cos(theta)]])
+    orientation = np.array([[1, 0, 0], [0, np.cos(theta), -np.sin(theta)], [0, np.sin(theta), np.cos(theta)]])
+
+    stl_file_1 = STLfile(r"test/test_assets/bin_test_model.stl")
+    face_collection_1 = stl_file_1.load(strict_vertex_policy=False, ignore_edges=True)
+    stl_file_2 = STLfile(r"test/test_assets/bin_test_model.stl")
+    face_collection_2 = stl_file_2.load(strict_vertex_policy=False, ignore_edges=True)
+    stl_file_2.transform(rotation)
+
+    # The same part in another pose gets the same fingerprint
+    fingerprint_1 = face_collection_1.get_fingerprint()
+    fingerprint_2 = face_collection_2.get_fingerprint()
+    assert fingerprint_1.key == fingerprint_2.key
+    assert not fingerprint_1.ambiguous
+
+    cache = AnalysisCache()
+    result_1, hit_1 = cache.analyse(face_collection_1, orientation, ignore_grounded=True)
+    # The same physical orientation, expressed as a rotation of the re-posed part
+    result_2, hit_2 = cache.analyse(face_collection_2, orientation @ rotation.T, ignore_grounded=True)
+    assert not hit_1
+    assert hit_2
+    assert result_2 == result_1
+
+    # Other analysis parameters are not shared
+    _, hit_3 = cache.analyse(face_collection_2, orientation @ rotation.T, ignore_grounded=False)
+    assert not hit_3
+
+    # Cached orientations are transformed to the pose of the part that asks for them
+    rotations = [r for r, _ in cache.entry(fingerprint_2).get_all(fingerprint_2, params=(('ignore_grounded', True),))]
+    assert np.allclose(rotations[0], orientation @ rotation.T)
+    stl_file_2.transform(rotations[0])
+    bad_faces, _ = face_collection_2.check_for_problems(ignore_grounded=True, ground_level=stl_file_2.ground_level)
+    assert len(bad_faces) == result_1['problem_faces']
+
+    # A mirror image is a different part
+    stl_file_3 = STLfile(r"test/test_assets/bin_test_model.stl")
+    face_collection_3 = stl_file_3.load(strict_vertex_policy=False, ignore_edges=True)
+    stl_file_3.transform(np.diag([-1.0, 1.0, 1.0]))
+    face_collection_3.fix_winding()
+    fingerprint_3 = face_collection_3.get_fingerprint()
+    assert fingerprint_3.key != fingerprint_1.key
+    assert not fingerprint_3.matches(fingerprint_1)
+    result_3, hit_3 = cache.analyse(face_collection_3, orientation, ignore_grounded=True)
+    assert not hit_3
+    rotated = face_collection_3.get_triangles() @ orientation.T
+    assert result_3 == calculate_overhangs(rotated, ignore_grounded=True,
+                                           ground_level=rotated[:, :, 2].min()).to_dict()
+
+
+def test_topology_report():
+    stl_file = STLfile(r"test/test_assets/bin-test-cube-0.stl")
+    face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+    report = face_collection.get_topology_report()
+    assert report.is_closed()
+    assert report.is_manifold()
+    assert len(report.get_faces_to_skip()) == 0
+
+    vertices, faces = face_collection.get_welded_arrays()
+    # Remove one face to make a hole, and repeat another
+    broken = np.concatenate([faces[1:], faces[[5]]])
+    report = check_topology(vertices, broken)
+
+    assert not report.is_closed()
+    assert len(report.boundary_edges) == 3
+    assert len(report.boundary_loops) == 1
+    assert sorted(report.boundary_loops[0]) == sorted(faces[0])
+    assert list(report.duplicate_faces) == [11]
+    assert len(report.degenerate_faces) == 0
+    assert len(report.non_manifold_edges) == 3
+
+    # A separate sliver with no area
+    sliver_vertices = np.concatenate([vertices, [[0, 0, 0], [1, 1, 1], [2, 2, 2]]])
+    report = check_topology(sliver_vertices, np.concatenate([broken, [[8, 9, 10]]]))
+    assert list(report.degenerate_faces) == [12]
+    assert len(report.boundary_loops) == 2
+    assert 4 in report.non_manifold_faces and 11 in report.non_manifold_faces
+
+
+def test_wall_thickness():
+    error_tolerance = 0.001
+    stl_file = STLfile(r"test/test_assets/bin-test-cube-0.stl")
+    face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+
+    # Every ray crosses the cube, one edge = 100mm
+    thin_faces, ok_faces = face_collection.check_wall_thickness(150)
+    assert len(thin_faces) == 12
+    assert all(abs(f.thickness - 100) < error_tolerance for f in face_collection.faces)
+    assert abs(face_collection.thin_area - 60000) < error_tolerance
+
+    # Rays are stopped before they reach the other side
+    thin_faces, ok_faces = face_collection.check_wall_thickness(50)
+    assert len(thin_faces) == 0
+    assert len(ok_faces) == 12
+    assert face_collection.thin_area == 0
+
+
+def test_uniform_grid_long_triangle():
+    # Many small triangles on the floor, and one long thin triangle along the space diagonal
+    x, y = np.meshgrid(np.arange(100.0), np.arange(100.0))
+    corners = np.stack([x.ravel(), y.ravel(), np.zeros(x.size)], axis=1)
+    small = np.stack([corners, corners + [0.5, 0, 0], corners + [0, 0.5, 0]], axis=1)
+    diagonal = np.array([[[0, 0, 1], [100, 100, 100], [100, 100.1, 100]]])
+    grid = UniformGrid(np.concatenate([small, diagonal]))
+
+    # The diagonal triangle is not copied into every cell of its bounding box
+    assert list(grid.overflow_triangles) == [len(small)]
+    assert len(grid.cell_triangles) <= 1024 * len(small)
+
+    # Rays still hit both the small triangles and the diagonal triangle
+    origins = np.array([[10.1, 20.1, 10], [50, 50.05, 0]])
+    directions = np.array([[0, 0, -1], [0, 0, 1]])
+    distance, triangle_ids = grid.cast_rays(origins, directions)
+    assert list(triangle_ids) == [2010, len(small)]
+    assert abs(distance[0] - 10) < 1e-9
+    assert 0 < distance[1] < 100
+
+
+def test_orient_faces():
+    # Two separate cubes, with some faces of the second one inverted
+    stl_file = STLfile(r"test/test_assets/bin-test-cube-0.stl")
+    face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+    vertices, faces = np.unique(face_collection.get_triangles().reshape(-1, 3), axis=0, return_inverse=True)
+    faces = faces.reshape(-1, 3)
+    vertices = np.concatenate([vertices, vertices + [200, 0, 0]])
+    faces = np.concatenate([faces, faces + len(vertices) // 2])
+    faces[[13, 20]] = faces[[13, 20]][:, [0, 2, 1]]
+    report = orient_faces(vertices, faces)
+    assert list(report.flipped) == [13, 20]
+    assert report.components == 2 and report.conflicts == 0
+
+    # A Moebius strip has no consistent winding
+    angle = np.linspace(0, 2 * np.pi, 8, endpoint=False)
+    ring = np.stack([np.cos(angle), np.sin(angle), np.zeros(8)], axis=1)
+    vertices = np.concatenate([ring * 10, ring * 10 + [0, 0, 1]])
+    top = np.arange(8, 16)
+    bottom = np.arange(8)
+    next_top = np.concatenate([top[1:], bottom[:1]])  # The strip is joined with a half twist
+    next_bottom = np.concatenate([bottom[1:], top[:1]])
+    faces = np.concatenate([np.stack([bottom, next_bottom, next_top], axis=1),
+                            np.stack([bottom, next_top, top], axis=1)])
+    report = orient_faces(vertices, faces)
+    assert report.components == 1 and report.conflicts == 1
+
+
+def test_find_cavities():
+    stl_file = STLfile(r"test/test_assets/bin-test-cube-0.stl")
+    face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+    grid = face_collection.get_voxel_grid(5)
+    assert grid.occupied.shape == (20, 20, 20)
+    assert grid.get_volume() == 1000000
+    assert face_collection.find_cavities(5) == []
+    assert face_collection.get_voxel_grid(5) is grid
+
+    # A smaller cube with inverted winding inside the cube is an enclosed void
+    triangles = face_collection.get_triangles()
+    inner = ((triangles - [50, 50, 100]) * 0.3 + [60, 50, 100])[:, [0, 2, 1]]
+    cavities = find_cavities(voxelize(np.concatenate([triangles, inner]), 2))
+    assert len(cavities) == 1
+    assert abs(cavities[0].volume - 30 ** 3) < 0.05 * 30 ** 3
+    assert np.allclose(cavities[0].bounds_min, [45, 35, 85], atol=2)
+    assert np.allclose(cavities[0].bounds_max, [75, 65, 115], atol=2)
+
+    stl_file = STLfile(r"test/test_assets/bin_test_model.stl")
+    face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+    cavities = face_collection.find_cavities(1.0)
+    assert len(cavities) == 1
+    assert abs(cavities[0].volume - 20200) < 200
 
 
+def test_estimate_overhangs():
+    stl_file = STLfile(r"test/test_assets/bin_test_model.stl")
+    face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+    face_collection.check_for_problems(ignore_grounded=True, ground_level=stl_file.ground_level)
+
+    estimate = estimate_overhangs(r"test/test_assets/bin_test_model.stl", ignore_grounded=True)
+    assert estimate.samples == 2000
+    assert abs(estimate.total_area - face_collection.get_mass_properties().area) < 0.001
+
+    # The exact totals are within a few confidence intervals of the estimates
+    for name in ('affected_area', 'affected_area_projected', 'support_volume'):
+        value = getattr(estimate, name)
+        assert abs(value.value - getattr(face_collection, name)) < 3 * value.error
+    fraction = face_collection.affected_area / estimate.total_area
+    assert abs(estimate.problem_area_fraction.value - fraction) < 3 * estimate.problem_area_fraction.error
+
+    refined = estimate_overhangs(r"test/test_assets/bin_test_model.stl", ignore_grounded=True, target_error=0.01)
+    assert refined.samples > estimate.samples
+
+    # A model without faces has no overhangs
+    empty = estimate_overhangs(np.zeros(0, dtype=BINARY_FACET_DTYPE))
+    assert empty.samples == 0 and empty.total_area == 0
+    assert empty.affected_area.value == 0 and empty.affected_area.error == 0
+    assert refined.problem_area_fraction.error <= 0.01
+    assert refined.affected_area.error <= 0.01 * refined.total_area
+
+    # A sample without problem faces is not exact
+    estimate = estimate_overhangs(r"test/test_assets/bin-test-cube-0.stl", samples=100)
+    assert estimate.affected_area.value == 0
+    assert estimate.problem_area_fraction.error > 0
+    assert estimate.affected_area.error > 0
+    assert estimate.support_volume.error > 0
+    refined = estimate_overhangs(r"test/test_assets/bin-test-cube-0.stl", samples=100, target_error=0.01)
+    assert refined.samples > 100
+    assert refined.problem_area_fraction.error <= 0.01
+
+
+def test_face_table_queries():
+    error_tolerance = 0.001
+    stl_file = STLfile(r"test/test_assets/bin-test-cube-0.stl")
+    face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+
+    # Iteration is reentrant
+    pairs = [(a, b) for a in face_collection for b in face_collection]
+    assert len(pairs) == 12 * 12
+
+    table = face_collection.get_face_table()
+    assert len(table) == 12
+    assert not table.problem.any()
+    assert abs(table.sum('area') - 60000) < error_tolerance
+    assert len(table.select(z_range=(50, 50))) == 10  # Bottom side, and every wall triangle touches the bottom
+    assert len(table.select(angle_range=(0, 0.01))) == 2  # Bottom side
+
+    bad_faces, ok_faces = face_collection.check_for_problems(ignore_grounded=True, ground_level=stl_file.ground_level)
+    table = face_collection.get_face_table()
+    assert list(table.select(problem=True)) == [face_collection.faces.index(f) for f in bad_faces]
+    assert face_collection.select_faces(problem=True) == bad_faces
+    assert abs(table.sum('area_projected', table.select(problem=True)) - face_collection.affected_area_projected) \
+        < error_tolerance
+    assert len(face_collection.get_vertices("bad")) == len(bad_faces)
+
+    # The table follows the geometry
+    stl_file.rotate(np.pi / 2, "x")
+    table = face_collection.get_face_table()
+    assert abs(table.z_max.max() - table.z_min.min() - 100) < error_tolerance
+    assert len(table.select(angle_range=(0, 0.01))) == 2
+    assert not table.z_min.flags.writeable
+
+
+def test_z_order_sweep():
+    stl_file = STLfile(r"test/test_assets/bin_test_model.stl")
+    face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+
+    by_top = face_collection.get_faces_by_top_z()
+    assert [f.get_top_z() for f in by_top] == [f.get_top_z() for f in sorted(face_collection.faces)]
+
+    # Every face enters once and leaves once, and the active faces are cut by the plane
+    z_order = face_collection.get_z_order()
+    active = set()
+    entered = 0
+    for z, entering, leaving in z_order.sweep(step=5):
+        active.update(entering.tolist())
+        active.difference_update(leaving.tolist())
+        entered += len(entering)
+        assert active == set(z_order.get_active(z).tolist())
+    assert entered == len(face_collection.faces)
+    assert len(active) == 0
+
+    events = list(z_order.events())
+    assert len(events) == 2 * len(face_collection.faces)
+    assert all(a[0] >= b[0] for a, b in zip(events[:-1], events[1:]))
+
+    with pytest.raises(ValueError):
+        next(z_order.sweep())
+
+    # The support cross-section grows towards the ground, until it covers all problem faces
+    face_collection.check_for_problems(ignore_grounded=True, ground_level=stl_file.ground_level)
+    levels, areas = face_collection.get_support_profile(0.5)
+    assert np.all(np.diff(levels) < 0) and np.all(np.diff(areas) >= 0)
+    assert abs(areas[-1] - face_collection.affected_area_projected) < 0.001
+    assert areas.sum() * 0.5 >= face_collection.support_volume * 0.9
+
+    # The ordering is refreshed when the model is transformed
+    stl_file.rotate(np.pi, "x")
+    assert face_collection.get_z_order() is not z_order
+    assert face_collection.get_faces_by_top_z()[0].get_top_z() == max(f.get_top_z() for f in face_collection.faces)
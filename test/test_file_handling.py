@@ -1,5 +1,17 @@
-from am_stl.stl.stl_parser import STLfile
-from am_stl.stl.stl_builder import STLCreator
+from am_stl.exceptions import STL_PRECISION_EXCEPTION
+from am_stl.stl.stl_parser import STLfile, read_binary_facets
+from am_stl.stl.stl_builder import STLCreator, build_plate_file
+from am_stl.geometry.nesting import nest_parts
+from am_stl.stl.file_types import open_mesh_file
+from am_stl.stl.mesh_state import MeshState
+from am_stl.stl.obj_parser import OBJfile
+from am_stl.stl.ply_parser import PLYfile
+from am_stl.stl.threemf_parser import ThreeMFfile
+from am_stl.stl.stl_colors import PROBLEM_COLOR, angle_heat_map, classification_colors, decode_colors, encode_colors
+import numpy as np
+import copy
+import pickle
+import pytest
 import tempfile
 import uuid
 
@@ -41,3 +53,321 @@ def test_save_ascii():
     assert len(stl_file_2.vertices) == vertices_count
     assert len(stl_file_2.normals) == normals_count
     assert len(face_collection_2.faces) == faces_count
+
+
+def test_load_arrays():
+    stl_file_1 = STLfile(r"test/test_assets/bin-test-cube-0.stl")
+    face_collection_1 = stl_file_1.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True)
+    vertices, faces = face_collection_1.get_welded_arrays()
+
+    stl_file_2 = STLfile(None)
+    face_collection_2 = stl_file_2.load_arrays(vertices, faces)
+
+    # Shared vertices are kept, without welding
+    assert len(stl_file_2.vertices) == 8
+    assert len(face_collection_2.faces) == 12
+    assert len(face_collection_2.vertex_collection) == 8
+    assert len(face_collection_2.edge_collection) == 18
+    assert stl_file_2.ground_level == stl_file_1.ground_level
+
+
+def test_load_ply():
+    stl_file = STLfile(r"test/test_assets/bin_test_model.stl")
+    stl_face_collection = stl_file.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True)
+
+    ply_file = open_mesh_file(r"test/test_assets/bin_test_model.ply")
+    face_collection = ply_file.load(ignore_edges=True)
+
+    # Same model as the STL, but without any duplicated vertices
+    assert isinstance(ply_file, PLYfile)
+    assert len(ply_file.vertices) == 3434
+    assert len(ply_file.normals) == len(stl_face_collection.faces)
+    assert len(face_collection.faces) == len(stl_face_collection.faces)
+    assert len(face_collection.vertex_collection) == 3434
+    assert abs(face_collection.get_mass_properties().volume - stl_face_collection.get_mass_properties().volume) < 0.001
+
+    bad_faces, ok_faces = face_collection.check_for_problems(ignore_grounded=True)
+    assert len(bad_faces) == 664
+    assert len(ok_faces) == 6196
+    assert ply_file.header == "PLY"
+
+    # A point cloud has no faces to load
+    tmp_file_name = f'{tempfile.gettempdir()}/{uuid.uuid4()}.ply'
+    with open(tmp_file_name, 'w') as f:
+        f.write('ply\nformat ascii 1.0\nelement vertex 1\nproperty float x\nproperty float y\nproperty float z\n'
+                'end_header\n0 0 0\n')
+    with pytest.raises(TypeError, match='no face element'):
+        PLYfile(tmp_file_name).load()
+
+    # Only the first list of each face has three values, the faces are read one by one
+    header = ('ply\nformat binary_little_endian 1.0\nelement vertex 4\nproperty float x\nproperty float y\n'
+              'property float z\nelement face 3\nproperty list uchar int vertex_indices\n'
+              'property list uchar uchar flags\nend_header\n')
+    with open(tmp_file_name, 'wb') as f:
+        f.write(header.encode('ascii'))
+        f.write(np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]], dtype='<f4').tobytes())
+        for face, flags in (([0, 2, 1], [1, 2, 3]), ([0, 1, 3], [1, 2, 3, 3, 5]), ([0, 3, 2], [1])):
+            f.write(bytes([3]) + np.array(face, dtype='<i4').tobytes() + bytes([len(flags)] + flags))
+    ply_file = PLYfile(tmp_file_name)
+    face_collection = ply_file.load(ignore_edges=True)
+    assert np.array_equal(face_collection.get_face_indices(), [[0, 2, 1], [0, 1, 3], [0, 3, 2]])
+
+    # Vertices with lists are rejected, instead of silently loading no vertices
+    with open(tmp_file_name, 'w') as f:
+        f.write('ply\nformat ascii 1.0\nelement vertex 1\nproperty float x\nproperty float y\nproperty float z\n'
+                'property list uchar float weights\nelement face 0\nproperty list uchar int vertex_indices\n'
+                'end_header\n0 0 0 1 1\n')
+    with pytest.raises(TypeError, match='list properties'):
+        PLYfile(tmp_file_name).load()
+
+
+def test_load_obj():
+    obj_file = open_mesh_file(r"test/test_assets/ascii_test_cube.obj")
+    face_collection = obj_file.load()
+
+    # Quads are split into two triangles each
+    assert isinstance(obj_file, OBJfile)
+    assert len(obj_file.vertices) == 8
+    assert len(face_collection.faces) == 12
+    assert len(face_collection.edge_collection) == 18
+    assert abs(face_collection.get_mass_properties().volume - 100 ** 3) < 0.001
+    assert obj_file.ground_level == 50
+
+
+def test_load_3mf():
+    threemf_file = open_mesh_file(r"test/test_assets/test_cube.3mf")
+    face_collection = threemf_file.load(ignore_edges=True)
+
+    # The model is stored in centimeters, and translated by the build item
+    assert isinstance(threemf_file, ThreeMFfile)
+    assert len(threemf_file.vertices) == 8
+    assert len(face_collection.faces) == 12
+    assert abs(face_collection.get_mass_properties().volume - 100 ** 3) < 0.001
+    assert abs(threemf_file.ground_level - 50) < 0.001
+
+
+def test_save_binary_round_trip_attributes():
+    stl_file_1 = STLfile(r"test/test_assets/bin_test_model.stl")
+    face_collection_1 = stl_file_1.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True)
+    face_collection_1.check_for_problems(ignore_grounded=True)
+
+    tmp_file_name = f'{tempfile.gettempdir()}/{uuid.uuid4()}.stl'
+    STLCreator(tmp_file_name, face_collection_1).build_colored_file(classification_colors(face_collection_1))
+
+    stl_file_2 = STLfile(tmp_file_name)
+    face_collection_2 = stl_file_2.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True)
+    assert len(face_collection_2.faces) == len(face_collection_1.faces)
+    assert stl_file_2.color_format == 'viscam'
+    assert np.allclose(stl_file_2.vertices, stl_file_1.vertices)
+
+    colors, valid = stl_file_2.get_face_colors()
+    problem = np.array([f.has_bad_angle for f in face_collection_1.faces])
+    assert valid.all()
+    assert np.all(colors[problem] == PROBLEM_COLOR)
+    assert (colors == PROBLEM_COLOR).all(axis=1).sum() == 664
+
+    # Attribute words from the loaded file are written back as they are
+    tmp_file_name_2 = f'{tempfile.gettempdir()}/{uuid.uuid4()}.stl'
+    STLCreator(tmp_file_name_2, face_collection_2).build_binary_file()
+    stl_file_3 = STLfile(tmp_file_name_2)
+    stl_file_3.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True)
+    assert np.array_equal(stl_file_3.attributes, stl_file_2.attributes)
+
+
+def test_magics_colors():
+    colors = np.array([[1, 0, 0], [0, 1, 0], [0, 0, 1]])
+    for color_format in ['viscam', 'magics']:
+        decoded, valid = decode_colors(encode_colors(colors, color_format), color_format)
+        assert valid.all()
+        assert np.array_equal(decoded, colors)
+
+    stl_file_1 = STLfile(r"test/test_assets/bin-test-cube-0.stl")
+    face_collection_1 = stl_file_1.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True)
+    face_collection_1.check_for_problems()
+
+    tmp_file_name = f'{tempfile.gettempdir()}/{uuid.uuid4()}.stl'
+    angles = [f.angle for f in face_collection_1.faces]
+    STLCreator(tmp_file_name, face_collection_1).build_colored_file(angle_heat_map(angles), color_format='magics')
+
+    stl_file_2 = STLfile(tmp_file_name)
+    stl_file_2.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True)
+    assert stl_file_2.color_format == 'magics'
+    decoded, valid = stl_file_2.get_face_colors()
+    assert valid.all()
+    assert np.allclose(decoded, angle_heat_map(angles), atol=1 / 31)
+
+    # A header that is not valid UTF-8 does not make a plain binary file colored
+    header, records = read_binary_facets(r"test/test_assets/bin-test-cube-0.stl")
+    tmp_file_name_2 = f'{tempfile.gettempdir()}/{uuid.uuid4()}.stl'
+    with open(tmp_file_name_2, 'wb') as f:
+        f.write(b'binary \xff\xfe'.ljust(80, b' '))
+        f.write(len(records).to_bytes(4, byteorder='little', signed=False))
+        f.write(records.tobytes())
+    stl_file_3 = STLfile(tmp_file_name_2)
+    face_collection_3 = stl_file_3.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True)
+    assert len(face_collection_3.faces) == len(records)
+    assert stl_file_3.color_format is None
+    assert stl_file_3.get_face_colors() is None
+
+    # A few attribute words with the valid bit set, e.g. left over by an exporter, are not VisCAM colours
+    records['attribute'][:2] = 1 << 15
+    with open(tmp_file_name_2, 'wb') as f:
+        f.write(b'binary'.ljust(80, b' '))
+        f.write(len(records).to_bytes(4, byteorder='little', signed=False))
+        f.write(records.tobytes())
+    stl_file_4 = STLfile(tmp_file_name_2)
+    with pytest.warns(DeprecationWarning):
+        stl_file_4.load_binary(color=True, strict_vertex_policy=False, ignore_edges=True)
+    assert stl_file_4.color_format is None
+
+
+def test_repair_winding():
+    stl_file_1 = STLfile(r"test/test_assets/bin_test_model.stl")
+    face_collection_1 = stl_file_1.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True)
+    bad_faces_1, _ = face_collection_1.check_for_problems(ignore_grounded=True)
+
+    # Invert the winding of some facets, but keep their stored normals, as a bad exporter would
+    header, records = read_binary_facets(r"test/test_assets/bin_test_model.stl")
+    inverted = np.array([0, 17, 512, 4000, 6859])
+    records['vertices'][inverted] = records['vertices'][inverted][:, [0, 2, 1]]
+    tmp_file_name = f'{tempfile.gettempdir()}/{uuid.uuid4()}.stl'
+    with open(tmp_file_name, 'wb') as f:
+        f.write(header)
+        f.write(len(records).to_bytes(4, byteorder='little'))
+        f.write(records.tobytes())
+
+    stl_file_2 = STLfile(tmp_file_name)
+    face_collection_2 = stl_file_2.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True)
+    bad_faces_2, _ = face_collection_2.check_for_problems(ignore_grounded=True)
+    assert len(bad_faces_2) != len(bad_faces_1)
+
+    stl_file_3 = STLfile(tmp_file_name)
+    face_collection_3 = stl_file_3.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True,
+                                        repair_winding=True)
+    report = stl_file_3.winding_report
+    assert list(report.flipped) == list(inverted)
+    # The normal from when the model was loaded is kept
+    flipped_face = face_collection_3.faces[inverted[0]]
+    assert np.allclose(flipped_face.n_hat_original, -flipped_face.refresh_normal_vector())
+    assert len(report.normal_mismatches) == 0
+    assert report.components == 2  # The model consists of two shells
+    assert report.conflicts == 0
+
+    bad_faces_3, _ = face_collection_3.check_for_problems(ignore_grounded=True)
+    assert len(bad_faces_3) == len(bad_faces_1)
+    assert abs(face_collection_3.affected_area - face_collection_1.affected_area) < 0.001
+
+
+def test_nest_and_build_plate():
+    error_tolerance = 0.001
+    cube = r"test/test_assets/bin-test-cube-0.stl"
+    face_collection = STLfile(r"test/test_assets/bin_test_model.stl").load(strict_vertex_policy=False,
+                                                                         ignore_edges=True)
+    parts = [cube, face_collection, cube, cube]
+
+    # Three 100mm cubes fit next to each other with 5mm spacing, the model does not fit beside them
+    result = nest_parts(parts, (320, 250), pixel_size=1.0, spacing=5)
+    translations = result.get_translations()
+    assert result.unplaced == [1]
+    assert translations[1] is None
+    x_positions = sorted(t[0] for t in translations if t is not None)
+    assert all(b - a >= 105 for a, b in zip(x_positions[:-1], x_positions[1:]))
+    assert all(abs(t[2] + 50) < error_tolerance for t in translations if t is not None)
+    assert abs(result.get_utilisation() - 30000 / (320 * 250)) < 0.01
+
+    tmp_file_name = f'{tempfile.gettempdir()}/{uuid.uuid4()}.stl'
+    assert build_plate_file(tmp_file_name, parts, translations) == 36
+    _, records = read_binary_facets(tmp_file_name)
+    assert len(records) == 36
+    assert np.allclose(records['vertices'].reshape(-1, 3).min(axis=0), [0, 0, 0], atol=error_tolerance)
+    assert records['vertices'][:, :, 2].max() <= 100 + error_tolerance
+
+
+def test_mesh_state_serialization():
+    error_tolerance = 0.001
+    stl_file_1 = STLfile(r"test/test_assets/bin_test_model.stl")
+    face_collection_1 = stl_file_1.load(strict_vertex_policy=False, ignore_edges=True)
+    bad_faces, ok_faces = face_collection_1.check_for_problems(ignore_grounded=True)
+
+    # Protocol 5 passes the arrays out of band
+    buffers = []
+    data = pickle.dumps(face_collection_1, protocol=5, buffer_callback=buffers.append)
+    assert len(buffers) > 0
+    face_collection_2 = pickle.loads(data, buffers=buffers)
+    assert len(face_collection_2.faces) == len(face_collection_1.faces)
+    assert len(face_collection_2.problem_faces) == len(bad_faces)
+    assert abs(face_collection_2.affected_area - face_collection_1.affected_area) < error_tolerance
+    assert np.allclose(face_collection_2.get_triangles(), face_collection_1.get_triangles())
+
+    # The rebuilt collection can be analysed again
+    bad_faces_2, _ = face_collection_2.check_for_problems(ignore_grounded=True)
+    assert len(bad_faces_2) == len(bad_faces)
+
+    # Copies keep the default behaviour, and do not go through a MeshState
+    assert face_collection_1.__reduce_ex__(4)[0] is not MeshState.to_face_collection
+    face_collection_copy = copy.copy(face_collection_1)
+    assert face_collection_copy.faces is face_collection_1.faces
+    assert face_collection_copy.stlfile is face_collection_1.stlfile
+
+    # Arrays passed as bytes are read-only, the rebuilt model owns writable copies
+    buffers = []
+    data = pickle.dumps(face_collection_1, protocol=5, buffer_callback=buffers.append)
+    face_collection_2 = pickle.loads(data, buffers=[bytes(b.raw()) for b in buffers])
+    face_collection_2.faces[0].vertices[0].set_array([1, 2, 3])
+    assert face_collection_2.stlfile.vertices.flags['OWNDATA']
+
+    handle = MeshState.from_face_collection(face_collection_1).to_shared_memory()
+    remote_handle = pickle.loads(pickle.dumps(handle))
+    try:
+        face_collection_3 = remote_handle.to_face_collection()
+    finally:
+        remote_handle.close()
+        handle.unlink()
+    # The model does not point into the freed block
+    assert len(face_collection_3.problem_faces) == len(bad_faces)
+    assert face_collection_3.stlfile.ground_level == stl_file_1.ground_level
+    bad_faces_3, _ = face_collection_3.check_for_problems(ignore_grounded=True)
+    assert len(bad_faces_3) == len(bad_faces)
+
+
+def test_float32_precision():
+    error_tolerance = 0.001
+    stl_file_1 = STLfile(r"test/test_assets/bin_test_model.stl")
+    face_collection_1 = stl_file_1.load(strict_vertex_policy=False, ignore_edges=True)
+    stl_file_2 = STLfile(r"test/test_assets/bin_test_model.stl", precision='float32')
+    face_collection_2 = stl_file_2.load(strict_vertex_policy=False, ignore_edges=True)
+
+    assert stl_file_2.vertices.dtype == np.float32 and stl_file_2.vertices.flags['C_CONTIGUOUS']
+    assert stl_file_2.vertices.nbytes * 2 == stl_file_1.vertices.nbytes
+    # Binary STL files store float32, so the coordinates are identical
+    assert np.array_equal(stl_file_2.vertices, stl_file_1.vertices)
+
+    for stl_file in (stl_file_1, stl_file_2):
+        stl_file.rotate(0.7, 'x')
+    assert stl_file_2.vertices.dtype == np.float32
+    assert np.allclose(stl_file_2.vertices, stl_file_1.vertices, atol=stl_file_2.get_resolution())
+    bad_faces_1, _ = face_collection_1.check_for_problems(ignore_grounded=True, ground_level=stl_file_1.ground_level)
+    bad_faces_2, _ = face_collection_2.check_for_problems(ignore_grounded=True, ground_level=stl_file_2.ground_level)
+    assert len(bad_faces_2) == len(bad_faces_1)
+    assert abs(face_collection_2.affected_area - face_collection_1.affected_area) < error_tolerance
+
+    # The precision survives serialization and writing
+    face_collection_3 = pickle.loads(pickle.dumps(face_collection_2, protocol=5))
+    assert face_collection_3.stlfile.vertices.dtype == np.float32
+    tmp_file_name = f'{tempfile.gettempdir()}/{uuid.uuid4()}.stl'
+    STLCreator(tmp_file_name, face_collection_2).build_binary_file()
+    _, records = read_binary_facets(tmp_file_name)
+    assert np.array_equal(records['vertices'].reshape(-1, 3), stl_file_2.vertices)
+
+    # The tolerance check is cached through rotations, and repeated when the model is scaled
+    checked = face_collection_2._checked_tolerances
+    stl_file_2.rotate(0.3, 'y')
+    face_collection_2.check_for_problems(ignore_grounded=True, ground_level=stl_file_2.ground_level)
+    assert face_collection_2._checked_tolerances == checked
+
+    # Tolerances below the resolution of float32 coordinates are rejected
+    stl_file_2.transform(np.eye(3) * 1e5)
+    with pytest.raises(STL_PRECISION_EXCEPTION):
+        face_collection_2.check_for_problems(ground_tolerance=0.01)
+    with pytest.raises(TypeError):
+        STLfile(r"test/test_assets/bin_test_model.stl", precision='float16')
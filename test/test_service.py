@@ -0,0 +1,102 @@
+from am_stl.service.client import ServiceClient
+from am_stl.service.daemon import AnalysisService
+from am_stl.stl.stl_parser import STLfile
+import asyncio
+import json
+import numpy as np
+import os
+import pytest
+import shutil
+import socket
+import stat
+import tempfile
+import threading
+import uuid
+
+
+def start_service(**kwargs):
+    ready = threading.Event()
+    services = []
+
+    def on_ready(service):
+        services.append(service)
+        ready.set()
+
+    path = f'{tempfile.gettempdir()}/{uuid.uuid4()}.sock'
+    thread = threading.Thread(target=lambda: asyncio.run(AnalysisService(**kwargs).serve(path=path, ready=on_ready)))
+    thread.start()
+    assert ready.wait(10)
+    return services[0], thread
+
+
+def test_service_operations():
+    error_tolerance = 0.001
+    root = tempfile.mkdtemp()
+    shutil.copy(r"test/test_assets/bin-test-cube-0.stl", root)
+    service, thread = start_service(root=root)
+    try:
+        # Only the user can connect
+        assert stat.S_IMODE(os.stat(service.address).st_mode) == 0o600
+
+        with ServiceClient(service.address) as client:
+            loaded = client.load("bin-test-cube-0.stl")
+            assert loaded['faces'] == 12
+            assert not loaded['cached']
+            assert client.load(f"{root}/bin-test-cube-0.stl")['cached']
+
+            # Same results as the object based analysis
+            stl_file = STLfile(r"test/test_assets/bin-test-cube-0.stl")
+            face_collection = stl_file.load(strict_vertex_policy=False, ignore_edges=True)
+            bad_faces, _ = face_collection.check_for_problems(ignore_grounded=True,
+                                                              ground_level=stl_file.ground_level)
+            result = client.analyse(loaded['mesh_id'], ignore_grounded=True)
+            assert result['problem_faces'] == len(bad_faces)
+            assert abs(result['affected_area'] - face_collection.affected_area) < error_tolerance
+
+            rotated = client.rotate(loaded['mesh_id'], theta=np.pi / 4, axis='x')
+            assert abs(rotated['bounds_max'][2] - rotated['bounds_min'][2] - 100 * np.sqrt(2)) < error_tolerance
+            result = client.analyse(loaded['mesh_id'], ignore_grounded=True)
+            assert result['problem_faces'] == 0
+
+            assert client.export(loaded['mesh_id'], "exported.stl", colored=True)['faces'] == 12
+            stl_file_2 = STLfile(f"{root}/exported.stl")
+            stl_file_2.load(strict_vertex_policy=False, ignore_edges=True)
+            assert stl_file_2.color_format == 'viscam'
+
+            with pytest.raises(RuntimeError):
+                client.analyse('unknown')
+
+            # Files outside of the root are not accessible
+            with pytest.raises(RuntimeError, match='PermissionError'):
+                client.load(r"../bin-test-cube-0.stl")
+            with pytest.raises(RuntimeError, match='PermissionError'):
+                client.export(loaded['mesh_id'], f'{tempfile.gettempdir()}/{uuid.uuid4()}.stl')
+
+            # A request that is not JSON, e.g. from a web page, closes the connection before the body is read
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as raw:
+                raw.settimeout(10)
+                raw.connect(service.address)
+                body = json.dumps({'op': 'export', 'mesh_id': loaded['mesh_id'], 'filename': 'posted.stl'})
+                raw.sendall(f'POST / HTTP/1.1\r\nContent-Type: text/plain\r\n\r\n{body}\n'.encode('utf-8'))
+                responses = raw.makefile('rb').read().splitlines()
+            assert len(responses) == 1
+            assert not json.loads(responses[0])['ok']
+            assert not os.path.exists(f"{root}/posted.stl")
+            client.shutdown()
+    finally:
+        thread.join(10)
+    assert not thread.is_alive()
+
+
+def test_service_cache_bound():
+    # Room for the cube only, loading the model evicts it
+    service, thread = start_service(max_cache_bytes=12 * 9 * 8, executor='thread')
+    try:
+        with ServiceClient(service.address) as client:
+            cube = client.load(r"test/test_assets/bin-test-cube-0.stl")
+            client.load(r"test/test_assets/bin_test_model.stl")
+            assert cube['mesh_id'] not in service.cache
+            assert len(service.cache.meshes) == 1
+            client.shutdown()
+    finally:
+        thread.join(10)
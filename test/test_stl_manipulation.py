@@ -1,4 +1,5 @@
 from am_stl.stl.stl_parser import STLfile
+from am_stl.geometry.decimation import DecimationHierarchy
 import numpy as np
 
 
@@ -26,3 +27,43 @@ def test_rotate_geometry():
             assert abs(facecol.affected_area_projected - facecol.affected_area*np.cos(theta)) < error_tolerance
 
             stl_file_1.rotate(-theta, axis)
+
+
+def test_decimation_hierarchy():
+    stl_file = STLfile(r"test/test_assets/ascii_test_model.stl")
+    facecol = stl_file.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True)
+    hierarchy = DecimationHierarchy.from_face_collection(facecol, resolutions=(32, 8))
+
+    assert len(hierarchy.levels) == 3
+    assert len(hierarchy.levels[0].faces) == len(facecol.faces)
+    for finer, coarser in zip(hierarchy.levels, hierarchy.levels[1:]):
+        assert len(coarser.faces) < len(finer.faces)
+        # A vertex can never be moved further than the diagonal of its grid cell
+        assert coarser.max_error <= coarser.cell_size * np.sqrt(3)
+
+    assert hierarchy.levels[-1].removed_area > 0
+    coarse_facecol = STLfile(None).load_arrays(hierarchy.levels[-1].vertices, hierarchy.levels[-1].faces,
+                                               ignore_edges=True)
+    assert len(coarse_facecol.faces) == len(hierarchy.levels[-1].faces)
+
+    # The coarse level agrees with the full mesh within its estimated error
+    result, error = hierarchy.levels[-1].analyse()
+    full_result, _ = hierarchy.levels[0].analyse()
+    assert abs(result.affected_area - full_result.affected_area) <= error['affected_area']
+    assert abs(result.affected_area_projected - full_result.affected_area_projected) <= error['affected_area_projected']
+    assert abs(result.total_support_volume - full_result.total_support_volume) <= error['support_volume']
+
+
+def test_screen_orientations():
+    stl_file = STLfile(r"test/test_assets/ascii_test_model.stl")
+    facecol = stl_file.load(print_time_info=False, strict_vertex_policy=False, ignore_edges=True)
+    hierarchy = DecimationHierarchy.from_face_collection(facecol)
+
+    rotations = []
+    for theta in np.linspace(0, np.pi, 8):
+        rotations.append(np.array([[1, 0, 0], [0, np.cos(theta), -np.sin(theta)], [0, np.sin(theta), np.cos(theta)]]))
+
+    best_area = min(hierarchy.levels[0].analyse(r)[0].affected_area for r in rotations)
+    refined = hierarchy.screen_orientations(rotations, keep=3)
+    assert len(refined) == 3
+    assert abs(refined[0][1].affected_area - best_area) < 0.001